@@ -56,6 +56,10 @@ async def token(form_data: OAuth2PasswordRequestForm=Depends()):
         )
 
 
+def user_by_email(email: str):
+    return select(User).filter_by(email=email)
+
+
 async def get_current_user(request: str):
     try:
         # Extracting the authorization code from the request's query parameters
@@ -107,8 +111,7 @@ async def login_callback(
     current_user = await get_current_user(request.code)
     if current_user is not None:
         async with get_async_session() as session:
-            stmt = select(User).filter_by(email=current_user.get("email"))
-            result = await session.execute(stmt)
+            result = await session.execute(user_by_email(current_user.get("email")))
             user = result.scalar_one_or_none()
             
             # Check if user already exists, if not, create a new user
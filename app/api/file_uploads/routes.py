@@ -1,18 +1,122 @@
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, status
-from app.models import File, Chunk, User, Folder
+import asyncio
+import hmac
+import os
+import shutil
+import struct
+import time
+import uuid
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, status
+from app.models import File, Chunk, User, Folder, UploadSession
 from app.core.db import AsyncTransactional, get_async_session 
-from app.core.exceptions import UnauthorizedException
-from fastapi import UploadFile, Form
+from app.core.exceptions import CustomException, UnauthorizedException
+from fastapi import UploadFile, Form, Header
 from fastapi import File as fastapi_File
 from fastapi.responses import JSONResponse
-from sqlalchemy import select
-from app.api.file_uploads.tasks import retrieve_and_trigger_celery
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select, update, func
+from starlette.concurrency import run_in_threadpool
+from app.api.file_uploads.services import (
+    save_chunk,
+    save_chunks,
+    index_chunk_offsets,
+    iter_chunk_spans,
+    mark_chunk_received,
+    complete_upload,
+    release_file_chunks,
+    collect_chunk_blobs,
+    remove_assembled_files,
+    space_left,
+    charge_space,
+)
+from app.core.config import config
+from app.core.dependencies import AdmissionRoute
+from app.core.middlewares.authentication import get_user_by_id
+from app.core.storage import (
+    chunk_store,
+    iter_upload_file,
+    iter_request_body,
+    iter_bytes,
+    assembled_file_path,
+    parse_chunk_checksum,
+    is_compressible,
+    ByteRangeResponse,
+    ChunkRangeResponse,
+    media_type_for,
+)
+from app.core.utils import (
+    JwtService,
+    DownloadGrant,
+    SignedUrlService,
+    PossessionService,
+    possession_proof,
+    bitmap_size,
+    is_bit_set,
+    missing_ranges,
+)
+from app.schemas.api_v2_schemas import (
+    UploadSessionRequest,
+    UploadSessionResponse,
+    UploadSessionStatus,
+    InstantUploadRequest,
+    InstantUploadResponse,
+    BatchChunk,
+    BatchChunkStatus,
+    BatchUploadResponse,
+    DownloadLinkRequest,
+    DownloadLinkResponse,
+)
 from fastapi.responses import FileResponse
 from pydantic import UUID4
-from typing import Optional
+from typing import List, Optional
+
+file_router = APIRouter(route_class=AdmissionRoute)
+
+CHECKSUM_DESCRIPTION = (
+    "Checksum of the chunk as `sha256=<hex>`, `crc32c=<hex>` or a bare hex SHA-256, verified as the chunk "
+    "streams in. A SHA-256 also lets the server skip storing content it already has"
+)
+
+
+def link_or_copy(source, target) -> None:
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Filesystems without hard links still avoid the transfer and the rebuild
+        shutil.copyfile(source, target)
+
+
+def upload_session_with_file(upload_id, user_id):
+    return (
+        select(UploadSession, File)
+        .join(File, File.file_id == UploadSession.file_id)
+        .where(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    )
+
+
+async def get_upload_session(session, upload_id, user_id):
+    result = await session.execute(upload_session_with_file(upload_id, user_id))
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return row
+
+
+def legacy_upload_files(user_id, file_names):
+    """
+    Files `/upload-chunk` and `/upload-chunks` add chunks to, found by name.
+    Names are not unique per user, so files of upload sessions are left out
+    and, of the others sharing a name, the newest is picked.
+    """
+    return (
+        select(File)
+        .where(File.file_name.in_(file_names), File.user_id == user_id, ~File.upload_session.has())
+        .order_by(File.file_name, File.created_at.desc())
+        .distinct(File.file_name)
+    )
 
-file_router = APIRouter()
- 
 
 @file_router.post("/upload-chunk")
 async def upload_chunk(
@@ -25,7 +129,8 @@ async def upload_chunk(
     total_chunks: int=Form(...),
     is_complete: bool=Form(...),
     file_type: str=Form(...),
-    folder_id: Optional[UUID4]=Form(default=None)
+    folder_id: Optional[UUID4]=Form(default=None),
+    checksum: Optional[str]=Form(default=None, description=CHECKSUM_DESCRIPTION)
 ):
     current_user = request.user
     if not current_user:
@@ -41,10 +146,8 @@ async def upload_chunk(
                 folder_db = folder_db.scalar_one_or_none()
 
         async with get_async_session() as session:
-            file_db = await session.execute(
-                select(File).where(File.file_name == file_name, File.user_id == current_user.id)
-            )
-            file_db = file_db.scalar_one_or_none()
+            file_db = await session.execute(legacy_upload_files(current_user.id, [file_name]))
+            file_db = file_db.scalars().first()
 
             if not file_db:
                 file_db = File(
@@ -59,30 +162,143 @@ async def upload_chunk(
                 session.add(file_db)
                 await session.flush()
 
-            chunk_db = Chunk(
-                file_id=file_db.file_id,
-                sequence_number=sequence_number,
-                data=await file_data.read(),
-                is_received=True
+            stored = await chunk_store.write(
+                iter_upload_file(file_data),
+                expected_checksum=parse_chunk_checksum(checksum),
+                compressible=is_compressible(file_db.file_type),
             )
-            session.add(chunk_db)
+            try:
+                await save_chunk(session, file_db.file_id, sequence_number, stored)
+
+                if is_complete and sequence_number == total_chunks - 1:
+                    await index_chunk_offsets(session, file_db.file_id)
+                    # A retried final chunk must not charge the quota twice
+                    await complete_upload(session, file_db.file_id, current_user.id, background_tasks)
+                    await session.commit()
 
-            if is_complete and sequence_number == total_chunks - 1:
-                file_db.is_complete = True
-                user_db = await session.execute(select(User).where(User.id == current_user.id))
-                user_db = user_db.scalar_one()
-                user_db.space += total_file_size
+                    return JSONResponse(status_code=status.HTTP_200_OK, content={"detail": "File upload completed successfully"})
 
-                background_tasks.add_task(retrieve_and_trigger_celery, {"file_id": file_db.file_id, "file_name": file_db.file_name})
                 await session.commit()
+                return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"detail": "Chunk uploaded successfully"})
+            finally:
+                await chunk_store.discard(stored)
+
+    except CustomException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@file_router.post("/upload-chunks", response_model=BatchUploadResponse)
+async def upload_chunks(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    manifest: str=Form(..., description="JSON list of BatchChunk, one per part of `chunks` and in the same order"),
+    chunks: List[UploadFile]=fastapi_File(...),
+):
+    """
+    Uploads many chunks, of one or several files, in one request. Each chunk
+    is described like an `/upload-chunk` call and all of them are recorded in
+    a single transaction. A chunk that fails is reported in its status and
+    does not fail the others.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    try:
+        entries = TypeAdapter(List[BatchChunk]).validate_json(manifest)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    if len(entries) != len(chunks):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The manifest must describe every chunk")
+    if len(entries) > int(config.UPLOAD_BATCH_MAX_CHUNKS):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Too many chunks in one batch")
 
-                return JSONResponse(status_code=status.HTTP_200_OK, content={"detail": "File upload completed successfully"})
+    async with get_async_session() as session:
+        folder_ids = {entry.folder_id for entry in entries if entry.folder_id}
+        owned_folders = set()
+        if folder_ids:
+            owned_folders = await session.execute(
+                select(Folder.id).where(Folder.id.in_(folder_ids), Folder.user_id == current_user.id)
+            )
+            owned_folders = set(owned_folders.scalars().all())
+
+        files = await session.execute(legacy_upload_files(current_user.id, {entry.file_name for entry in entries}))
+        files = {file_db.file_name: file_db for file_db in files.scalars().all()}
+        for entry in entries:
+            if entry.file_name not in files:
+                files[entry.file_name] = File(
+                    user_id=current_user.id,
+                    file_name=entry.file_name,
+                    size=entry.total_file_size,
+                    total_chunks=entry.total_chunks,
+                    is_complete=False,
+                    file_type=entry.file_type,
+                    folder_id=entry.folder_id if entry.folder_id in owned_folders else None
+                )
+                session.add(files[entry.file_name])
+        await session.flush()
+
+        # Only the last copy of a chunk sent twice in the batch is stored
+        last_index = {(entry.file_name, entry.sequence_number): index for index, entry in enumerate(entries)}
+        statuses = []
+        pending = []
+        try:
+            for index, (entry, upload) in enumerate(zip(entries, chunks)):
+                file_db = files[entry.file_name]
+                chunk_status = BatchChunkStatus(
+                    index=index,
+                    file_name=entry.file_name,
+                    sequence_number=entry.sequence_number,
+                    file_id=file_db.file_id,
+                    status="rejected",
+                )
+                statuses.append(chunk_status)
+                if last_index[(entry.file_name, entry.sequence_number)] != index:
+                    chunk_status.status = "superseded"
+                elif entry.sequence_number >= file_db.total_chunks:
+                    chunk_status.detail = "Sequence number out of range"
+                else:
+                    try:
+                        stored = await chunk_store.write(
+                            iter_upload_file(upload),
+                            expected_checksum=parse_chunk_checksum(entry.checksum),
+                            compressible=is_compressible(file_db.file_type),
+                        )
+                    except CustomException as e:
+                        chunk_status.detail = e.message
+                    else:
+                        pending.append((chunk_status, stored))
+
+            changed = await save_chunks(
+                session,
+                [(chunk_status.file_id, chunk_status.sequence_number, stored, None) for chunk_status, stored in pending],
+            )
+            for chunk_status, _ in pending:
+                chunk_status.status = "stored" if (chunk_status.file_id, chunk_status.sequence_number) in changed else "unchanged"
+
+            received = await session.execute(
+                select(File.file_id)
+                .join(Chunk, Chunk.file_id == File.file_id)
+                .where(
+                    File.file_id.in_({chunk_status.file_id for chunk_status, _ in pending}),
+                    File.is_complete.is_not(True),
+                )
+                .group_by(File.file_id, File.total_chunks)
+                .having(func.count(Chunk.chunk_id) >= File.total_chunks)
+            )
+            completed_file_ids = []
+            for file_id in received.scalars().all():
+                await index_chunk_offsets(session, file_id)
+                if await complete_upload(session, file_id, current_user.id, background_tasks):
+                    completed_file_ids.append(file_id)
 
             await session.commit()
-            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"detail": "Chunk uploaded successfully"})
+        finally:
+            for _, stored in pending:
+                await chunk_store.discard(stored)
 
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return BatchUploadResponse(chunks=statuses, completed_file_ids=completed_file_ids)
 
 
 @file_router.delete("/delete-file/{file_id}")
@@ -91,8 +307,8 @@ async def delete_file(request: Request, file_id: int):
     current_user = request.user
     if current_user:
         async with get_async_session() as session:
-            # Retrieve the file record
-            file_result = await session.execute(select(File).filter(File.file_id == file_id))
+            # Retrieve the file record, other users' files are reported as missing
+            file_result = await session.execute(owned_file(file_id, current_user.id))
             file_db = file_result.scalar_one_or_none()
             
             if not file_db:
@@ -102,20 +318,562 @@ async def delete_file(request: Request, file_id: int):
             user_result = await session.execute(select(User).filter(User.id == current_user.id))
             user_db = user_result.scalar_one()
 
-            # Update user's space used
-            if user_db.space - file_db.size >= 0:
-                user_db.space -= file_db.size
-            else:
-                # Reset to 0 if subtraction goes below 0 (edge case handling)
-                user_db.space = 0
+            # Update user's space used, only complete files were charged
+            if file_db.is_complete:
+                user_db.space = max(user_db.space - file_db.size, 0)
 
-            # Delete the file from the database
+            # Delete the file from the database, committing expires file_db
+            deleted = [(file_db.file_id, file_db.file_name)]
+            released = await release_file_chunks(session, [file_db.file_id])
             await session.delete(file_db)
             await session.commit()
 
-            # Add code here to delete the file from the server's storage if necessary
-            # Handle any errors that may occur during file deletion
+            await remove_assembled_files(deleted)
+            # Chunk payloads no other file references are removed from the chunk store
+            await collect_chunk_blobs(released)
 
             return JSONResponse(status_code=status.HTTP_200_OK, content={"detail": "File deleted successfully"})
     else:
         raise UnauthorizedException()
+
+
+@file_router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(schema: UploadSessionRequest, request: Request):
+    """
+    Starts a resumable upload. Chunks are then sent to
+    `/uploads/{upload_id}/chunks/{sequence_number}` in any order and in parallel.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    if schema.chunk_size > int(config.UPLOAD_MAX_CHUNK_SIZE):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk size is too large")
+    # A file smaller than the minimum goes in a single chunk of any size
+    if schema.chunk_size < min(int(config.UPLOAD_MIN_CHUNK_SIZE), schema.total_file_size):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk size is too small")
+
+    total_chunks = max(1, -(-schema.total_file_size // schema.chunk_size))
+    if total_chunks > int(config.UPLOAD_MAX_CHUNKS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Files are split in {config.UPLOAD_MAX_CHUNKS} chunks at most, use larger chunks",
+        )
+    async with get_async_session() as session:
+        if schema.total_file_size > await space_left(session, current_user.id):
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Not enough storage space left")
+
+        folder_db = None
+        if schema.folder_id:
+            folder_db = await session.execute(
+                select(Folder).where(Folder.id == schema.folder_id, Folder.user_id == current_user.id)
+            )
+            folder_db = folder_db.scalar_one_or_none()
+
+        file_db = File(
+            user_id=current_user.id,
+            file_name=schema.file_name,
+            size=schema.total_file_size,
+            total_chunks=total_chunks,
+            is_complete=False,
+            file_type=schema.file_type,
+            folder_id=schema.folder_id if folder_db is not None else None
+        )
+        session.add(file_db)
+        await session.flush()
+
+        upload = UploadSession(
+            file_id=file_db.file_id,
+            user_id=current_user.id,
+            chunk_size=schema.chunk_size,
+            received=bytes(bitmap_size(total_chunks)),
+            received_count=0,
+        )
+        session.add(upload)
+        await session.flush()
+
+        # Committing expires the instances, the reply is built from them first
+        response = UploadSessionResponse(
+            upload_id=upload.id,
+            file_id=file_db.file_id,
+            chunk_size=upload.chunk_size,
+            total_chunks=total_chunks,
+        )
+        await session.commit()
+
+    return response
+
+
+async def store_upload_chunk(
+    upload_id,
+    sequence_number,
+    stream,
+    checksum,
+    user_id,
+    background_tasks,
+):
+    """
+    Stores one chunk of an upload session from `stream`, which is only
+    consumed once the chunk is known to be needed. The session is read,
+    and the chunk recorded, in short transactions of their own, so no
+    database connection is held while the chunk streams in. Returns the
+    status code and content of the reply.
+    """
+    expected_checksum = parse_chunk_checksum(checksum)
+    async with get_async_session() as session:
+        upload, file_db = await get_upload_session(session, upload_id, user_id)
+        file_id, size, file_type, total_chunks = file_db.file_id, file_db.size, file_db.file_type, file_db.total_chunks
+        chunk_size, received, received_count = upload.chunk_size, upload.received, upload.received_count
+
+    if not 0 <= sequence_number < total_chunks:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Sequence number out of range")
+
+    # A chunk resent after a disconnect is acknowledged without storing it again
+    if is_bit_set(received, sequence_number):
+        return status.HTTP_200_OK, {
+            "detail": "Chunk already received",
+            "received_chunks": received_count,
+            "total_chunks": total_chunks,
+        }
+
+    offset = sequence_number * chunk_size
+    expected_length = min(chunk_size, size - offset)
+    stored = await chunk_store.write(
+        stream(expected_length),
+        expected_checksum=expected_checksum,
+        compressible=is_compressible(file_type),
+    )
+    try:
+        if stored.length != expected_length:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk {sequence_number} must be {expected_length} bytes, got {stored.length}",
+            )
+
+        async with get_async_session() as session:
+            await save_chunk(session, file_id, sequence_number, stored, offset=offset)
+            received_count = await mark_chunk_received(session, upload_id, sequence_number)
+            if received_count == total_chunks:
+                await complete_upload(session, file_id, user_id, background_tasks)
+            await session.commit()
+    finally:
+        await chunk_store.discard(stored)
+
+    content = {"received_chunks": received_count, "total_chunks": total_chunks}
+    if received_count == total_chunks:
+        return status.HTTP_200_OK, {"detail": "File upload completed successfully", **content}
+    return status.HTTP_202_ACCEPTED, {"detail": "Chunk uploaded successfully", **content}
+
+
+@file_router.put("/uploads/{upload_id}/chunks/{sequence_number}")
+async def upload_session_chunk(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    upload_id: UUID4,
+    sequence_number: int,
+    file_data: UploadFile=Form(...),
+    checksum: Optional[str]=Form(default=None, description=CHECKSUM_DESCRIPTION),
+):
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    status_code, content = await store_upload_chunk(
+        upload_id,
+        sequence_number,
+        lambda expected_length: iter_upload_file(file_data),
+        checksum,
+        current_user.id,
+        background_tasks,
+    )
+    return JSONResponse(status_code=status_code, content=content)
+
+
+@file_router.put("/{upload_id}/chunks/{sequence_number}")
+async def upload_session_chunk_raw(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    upload_id: UUID4,
+    sequence_number: int,
+    checksum: Optional[str]=Header(default=None, alias="X-Chunk-Checksum", description=CHECKSUM_DESCRIPTION),
+):
+    """
+    Same as `/uploads/{upload_id}/chunks/{sequence_number}`, but the request
+    body is the chunk itself. It is streamed into the chunk store as it
+    arrives, with no multipart parsing, temporary file or in-memory copy.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    status_code, content = await store_upload_chunk(
+        upload_id,
+        sequence_number,
+        lambda expected_length: iter_request_body(request, limit=expected_length),
+        checksum,
+        current_user.id,
+        background_tasks,
+    )
+    return JSONResponse(status_code=status_code, content=content)
+
+
+# Binary upload frame: upload session id, sequence number, then the chunk payload
+UPLOAD_FRAME_HEADER = struct.Struct("!16sI")
+
+
+async def authenticate_websocket(websocket: WebSocket, token: Optional[str]):
+    # Browsers cannot set the Authorization header on a WebSocket, so the token may come as a query parameter or first message
+    if isinstance(websocket.user, User):
+        return websocket.user
+    if token is None:
+        try:
+            token = (await websocket.receive_json()).get("token")
+        except (ValueError, KeyError, AttributeError):
+            return None
+    try:
+        payload = await JwtService().verify_token(token)
+    except Exception:
+        return None
+    user_id = payload.get("user_id")
+    return await get_user_by_id(user_id) if user_id else None
+
+
+async def persist_upload_frames(websocket: WebSocket, queue: asyncio.Queue, user_id) -> None:
+    while True:
+        upload_id, sequence_number, payload = await queue.get()
+        reply = {"upload_id": str(upload_id), "sequence_number": sequence_number}
+        background_tasks = BackgroundTasks()
+        try:
+            status_code, content = await store_upload_chunk(
+                upload_id,
+                sequence_number,
+                lambda expected_length: iter_bytes(payload),
+                None,
+                user_id,
+                background_tasks,
+            )
+            # Nothing sends a response here, so the rebuild is scheduled by hand
+            await background_tasks()
+            reply.update(content, type="ack", status=status_code)
+        except HTTPException as e:
+            reply.update(type="error", status=e.status_code, detail=e.detail)
+        except CustomException as e:
+            reply.update(type="error", status=int(e.code), detail=e.message)
+        except Exception as e:
+            reply.update(type="error", status=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        finally:
+            queue.task_done()
+        await websocket.send_json(reply)
+
+
+async def receive_upload_frames(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if frame is None or len(frame) < UPLOAD_FRAME_HEADER.size:
+                await websocket.send_json({"type": "error", "status": status.HTTP_400_BAD_REQUEST, "detail": "Expected a binary chunk frame"})
+                continue
+            upload_id, sequence_number = UPLOAD_FRAME_HEADER.unpack_from(frame)
+            # Blocks while `window` chunks are queued, which pushes back on the client through TCP
+            await queue.put((uuid.UUID(bytes=upload_id), sequence_number, memoryview(frame)[UPLOAD_FRAME_HEADER.size:]))
+    except WebSocketDisconnect:
+        pass
+
+
+@file_router.websocket("/ws")
+async def upload_channel(websocket: WebSocket, token: Optional[str]=None):
+    """
+    Long lived upload channel for chunks of upload sessions. The client
+    authenticates once, with the Authorization header, a `token` query
+    parameter or a first `{"token": ...}` message, and receives
+    `{"type": "ready", "window": n}`. It then sends binary frames made of the
+    16 byte upload id, a 4 byte big endian sequence number and the chunk.
+
+    Every frame is answered by an `ack` or `error` message in arrival order,
+    carrying `received_chunks` and `total_chunks` as progress. At most
+    `window` frames may be unacknowledged; beyond that the server stops
+    reading the socket until its write queue drains.
+    """
+    await websocket.accept()
+    current_user = await authenticate_websocket(websocket, token)
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    window = int(config.WS_UPLOAD_WINDOW)
+    queue = asyncio.Queue(maxsize=window)
+    await websocket.send_json({"type": "ready", "window": window, "max_chunk_size": int(config.UPLOAD_MAX_CHUNK_SIZE)})
+
+    reader = asyncio.create_task(receive_upload_frames(websocket, queue))
+    writer = asyncio.create_task(persist_upload_frames(websocket, queue, current_user.id))
+    try:
+        # The channel ends with either side, a reader blocked on a full queue must not outlive the writer
+        await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Unacknowledged chunks are resent by the client, their upload is idempotent
+        reader.cancel()
+        writer.cancel()
+        await asyncio.gather(reader, writer, return_exceptions=True)
+
+
+@file_router.get("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def get_upload_session_status(request: Request, upload_id: UUID4):
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    async with get_async_session() as session:
+        upload, file_db = await get_upload_session(session, upload_id, current_user.id)
+
+    return UploadSessionStatus(
+        upload_id=upload.id,
+        file_id=file_db.file_id,
+        chunk_size=upload.chunk_size,
+        total_chunks=file_db.total_chunks,
+        received_chunks=upload.received_count,
+        missing=missing_ranges(upload.received, file_db.total_chunks),
+        is_complete=bool(file_db.is_complete),
+    )
+
+
+def instant_upload_source(content_hash, size):
+    """
+    A rebuilt file of any user with the given content, which an instant
+    upload links to instead of receiving the content again.
+    """
+    return (
+        select(File)
+        .where(File.content_hash == content_hash, File.size == size, File.is_ready.is_(True))
+        .limit(1)
+    )
+
+
+@file_router.post("/precheck", response_model=InstantUploadResponse)
+async def instant_upload(schema: InstantUploadRequest, request: Request):
+    """
+    Completes an upload without any transfer when a rebuilt file with the same
+    SHA-256 and size is already on the server. Otherwise `is_complete` is false
+    and the client uploads the chunks as usual.
+
+    The first call answers with a `challenge`: random ranges of the file the
+    client hashes, after the challenge nonce, into `proof`. Only a second call
+    carrying `challenge.token` and a `proof` matching the server's copy links
+    the file, so knowing a file's hash is not enough to obtain it. Every
+    request gets a challenge, which says nothing about what the server holds.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    content_hash = schema.content_hash.lower()
+    if schema.challenge is None or schema.proof is None:
+        return InstantUploadResponse(
+            is_complete=False,
+            challenge=PossessionService.issue(current_user.id, content_hash, schema.total_file_size),
+        )
+    challenge = PossessionService.verify(schema.challenge, current_user.id, content_hash, schema.total_file_size)
+
+    async with get_async_session() as session:
+        source = await session.execute(instant_upload_source(content_hash, schema.total_file_size))
+        source = source.scalar_one_or_none()
+        if source is None:
+            return InstantUploadResponse(is_complete=False)
+
+        try:
+            proof = await run_in_threadpool(
+                possession_proof,
+                assembled_file_path(source.file_id, source.file_name),
+                challenge.nonce,
+                challenge.ranges,
+            )
+        except FileNotFoundError:
+            return InstantUploadResponse(is_complete=False)
+        # A wrong proof is answered like a missing file, it must not confirm the content exists
+        if not hmac.compare_digest(proof.encode(), schema.proof.lower().encode()):
+            return InstantUploadResponse(is_complete=False)
+
+        if schema.total_file_size > await space_left(session, current_user.id):
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Not enough storage space left")
+
+        folder_db = None
+        if schema.folder_id:
+            folder_db = await session.execute(
+                select(Folder).where(Folder.id == schema.folder_id, Folder.user_id == current_user.id)
+            )
+            folder_db = folder_db.scalar_one_or_none()
+
+        file_db = File(
+            user_id=current_user.id,
+            file_name=schema.file_name,
+            size=schema.total_file_size,
+            total_chunks=0,
+            is_complete=True,
+            is_ready=True,
+            content_hash=content_hash,
+            file_type=schema.file_type,
+            folder_id=schema.folder_id if folder_db is not None else None
+        )
+        session.add(file_db)
+        await session.flush()
+
+        try:
+            await run_in_threadpool(
+                link_or_copy,
+                assembled_file_path(source.file_id, source.file_name),
+                assembled_file_path(file_db.file_id, file_db.file_name),
+            )
+        except FileNotFoundError:
+            # The matching file was deleted in the meantime
+            await session.rollback()
+            return InstantUploadResponse(is_complete=False)
+
+        await charge_space(session, current_user.id, schema.total_file_size)
+        # Committing expires file_db
+        file_id = file_db.file_id
+        await session.commit()
+
+    return InstantUploadResponse(is_complete=True, file_id=file_id)
+
+
+def file_content_response(
+    request: Request,
+    grant: DownloadGrant,
+    stat_result: Optional[os.stat_result],
+) -> ByteRangeResponse:
+    """
+    Serves the rebuilt file when it was found (`stat_result`), and the
+    file's chunks otherwise.
+    """
+    # A file never changes once complete, whichever copy serves it
+    etag = f'"{grant.file_id}-{grant.size:x}"'
+    path = str(assembled_file_path(grant.file_id, grant.file_name))
+    if stat_result is None:
+        return ChunkRangeResponse(
+            lambda start, stop: iter_chunk_spans(grant.file_id, start, stop),
+            chunk_store,
+            path,
+            request,
+            size=grant.size,
+            media_type=grant.media_type,
+            etag=etag,
+            filename=grant.file_name,
+            bounds=grant.byte_range,
+        )
+    return ByteRangeResponse(
+        path,
+        request,
+        size=stat_result.st_size,
+        media_type=grant.media_type,
+        etag=etag,
+        last_modified=stat_result.st_mtime,
+        filename=grant.file_name,
+        bounds=grant.byte_range,
+    )
+
+
+def owned_file(file_id: int, user_id):
+    return select(File).where(File.file_id == file_id, File.user_id == user_id)
+
+
+async def get_owned_complete_file(session, file_id: int, user_id) -> File:
+    result = await session.execute(owned_file(file_id, user_id))
+    file_db = result.scalar_one_or_none()
+    if file_db is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if not file_db.is_complete:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File upload is not complete")
+    return file_db
+
+
+@file_router.api_route("/{file_id}/content", methods=["GET", "HEAD"], response_class=ByteRangeResponse)
+async def download_file(request: Request, file_id: int):
+    """
+    Streams a file to its owner. Supports `Range` (single and multiple
+    ranges), `If-Range` and `If-None-Match` against the returned `ETag`, so
+    resumed downloads and media seeking only transfer what they need. A
+    completed upload is served straight from its chunks until the rebuilt
+    file is ready.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    async with get_async_session() as session:
+        file_db = await get_owned_complete_file(session, file_id, current_user.id)
+
+    grant = DownloadGrant(
+        file_id=file_db.file_id,
+        file_name=file_db.file_name,
+        media_type=media_type_for(file_db.file_type, file_db.file_name),
+        size=file_db.size,
+        expires=0,
+    )
+    stat_result = None
+    if file_db.is_ready:
+        try:
+            stat_result = await run_in_threadpool(os.stat, assembled_file_path(file_db.file_id, file_db.file_name))
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return file_content_response(request, grant, stat_result)
+
+
+@file_router.post("/{file_id}/links", response_model=DownloadLinkResponse)
+async def create_download_link(schema: DownloadLinkRequest, request: Request, file_id: int):
+    """
+    Mints an expiring signed link to the file, optionally limited to a byte
+    range and to the requesting address. Anyone holding the link can
+    download through it until it expires, without logging in.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    expires_in = schema.expires_in or int(config.DOWNLOAD_URL_TTL)
+    if expires_in > int(config.DOWNLOAD_URL_MAX_TTL):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Links expire after {config.DOWNLOAD_URL_MAX_TTL} seconds at most",
+        )
+
+    async with get_async_session() as session:
+        file_db = await get_owned_complete_file(session, file_id, current_user.id)
+
+    byte_range = None
+    if schema.range_start is not None or schema.range_end is not None:
+        start = schema.range_start or 0
+        stop = file_db.size if schema.range_end is None else schema.range_end + 1
+        if start >= min(stop, file_db.size):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Range is empty or past the end of the file")
+        byte_range = (start, min(stop, file_db.size))
+
+    grant = DownloadGrant(
+        file_id=file_db.file_id,
+        file_name=file_db.file_name,
+        media_type=media_type_for(file_db.file_type, file_db.file_name),
+        size=file_db.size,
+        expires=int(time.time()) + expires_in,
+        byte_range=byte_range,
+        ip=request.client.host if schema.bind_ip and request.client else None,
+    )
+    token = SignedUrlService.sign(grant)
+    return DownloadLinkResponse(url=str(request.url_for("download_shared_file", token=token)), expires_at=grant.expires)
+
+
+@file_router.api_route(
+    "/shared/{token}", methods=["GET", "HEAD"], response_class=ByteRangeResponse, name="download_shared_file"
+)
+async def download_shared_file(request: Request, token: str):
+    """
+    Serves a signed link from `/{file_id}/links`. The link is checked in
+    memory, without any database access while the rebuilt file exists.
+    Deleting the file removes both the rebuilt file and its chunks, so its
+    links answer 404 from then on.
+    """
+    grant = SignedUrlService.verify(token, request.client.host if request.client else None)
+    try:
+        stat_result = await run_in_threadpool(os.stat, assembled_file_path(grant.file_id, grant.file_name))
+    except FileNotFoundError:
+        stat_result = None
+    return file_content_response(request, grant, stat_result)
@@ -0,0 +1,452 @@
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import BackgroundTasks
+from sqlalchemy import select, update, delete, func, or_, literal_column, values, column, String, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from starlette.concurrency import run_in_threadpool
+
+from app.api.file_uploads.tasks import retrieve_and_trigger_celery
+from app.core.db import get_async_session
+from app.core.exceptions import ChunkPayloadGoneException, StorageQuotaExceededException
+from app.core.storage import StoredChunk, assembled_file_path, chunk_store
+from app.models import File, Chunk, ChunkBlob, User, UploadSession
+
+
+async def record_stored_size(session: AsyncSession, stored: StoredChunk, stored_size: int) -> None:
+    # Only compressed blobs record a size of their own
+    await session.execute(
+        update(ChunkBlob)
+        .where(ChunkBlob.content_hash == stored.checksum)
+        .values(stored_size=stored_size if stored_size != stored.length else None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def add_blob_reference(session: AsyncSession, stored: StoredChunk) -> None:
+    """
+    Counts one more chunk referencing the payload. The first reference
+    persists the staged payload, any later one drops it, so repeated content
+    costs no extra disk space. The payload is placed while the blob row is
+    still locked by this transaction, which keeps it safe from a concurrent
+    `collect_chunk_blobs`.
+
+    `write` does not stage content the store already holds. When that
+    content was collected before the row got locked there is nothing left
+    to persist, and ChunkPayloadGoneException asks the client to resend.
+    """
+    stmt = insert(ChunkBlob).values(content_hash=stored.checksum, size=stored.length, ref_count=1)
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChunkBlob.content_hash],
+            set_={"ref_count": ChunkBlob.ref_count + 1, "edited_at": func.now()},
+        )
+        .returning(literal_column("xmax = 0").label("created"))
+    )
+    created = result.scalar_one()
+
+    if created or not chunk_store.exists(stored.checksum):
+        if stored.staged is None:
+            raise ChunkPayloadGoneException()
+        await record_stored_size(session, stored, await chunk_store.persist(stored))
+    else:
+        await chunk_store.discard(stored)
+
+
+async def save_chunk(
+    session: AsyncSession,
+    file_id: int,
+    sequence_number: int,
+    stored: StoredChunk,
+    offset: Optional[int] = None,
+) -> None:
+    """
+    Records a stored chunk. A retry of the same sequence number updates the
+    existing row through the (file_id, sequence_number) unique index instead
+    of adding a duplicate, and only moves the blob reference when the
+    payload actually changed.
+    """
+    # Evaluated against the statement snapshot, so it yields the checksum before the upsert
+    previous = (
+        select(Chunk.checksum)
+        .where(Chunk.file_id == file_id, Chunk.sequence_number == sequence_number, Chunk.data.is_(None))
+        .scalar_subquery()
+    )
+    stmt = insert(Chunk).values(
+        file_id=file_id,
+        sequence_number=sequence_number,
+        offset=offset,
+        length=stored.length,
+        checksum=stored.checksum,
+        crc32c=stored.crc32c,
+        is_received=True,
+    )
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Chunk.file_id, Chunk.sequence_number],
+            set_={
+                "offset": stmt.excluded.offset,
+                "length": stmt.excluded.length,
+                "checksum": stmt.excluded.checksum,
+                "crc32c": stmt.excluded.crc32c,
+                "is_received": True,
+                "data": None,
+                "edited_at": func.now(),
+            },
+            where=or_(Chunk.checksum.is_distinct_from(stmt.excluded.checksum), Chunk.data.is_not(None)),
+        )
+        .returning(previous.label("previous_checksum"))
+    )
+    row = result.one_or_none()
+    if row is None:
+        # The same payload is already recorded for this chunk
+        await chunk_store.discard(stored)
+        return
+
+    await add_blob_reference(session, stored)
+    if row.previous_checksum is not None:
+        await session.execute(
+            update(ChunkBlob)
+            .where(ChunkBlob.content_hash == row.previous_checksum)
+            .values(ref_count=ChunkBlob.ref_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def add_blob_references(session: AsyncSession, stored_chunks: List[StoredChunk]) -> None:
+    """
+    Bulk form of `add_blob_reference`, one upsert for the whole list. Chunks
+    sharing a payload within the list persist it once. A needed payload that
+    none of them staged raises ChunkPayloadGoneException for the whole list.
+    """
+    if not stored_chunks:
+        return
+    refs = Counter(stored.checksum for stored in stored_chunks)
+    sizes = {stored.checksum: stored.length for stored in stored_chunks}
+    # Sorted, so concurrent batches lock the blob rows in the same order
+    stmt = insert(ChunkBlob).values([
+        {"content_hash": content_hash, "size": sizes[content_hash], "ref_count": count}
+        for content_hash, count in sorted(refs.items())
+    ])
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChunkBlob.content_hash],
+            set_={"ref_count": ChunkBlob.ref_count + stmt.excluded.ref_count, "edited_at": func.now()},
+        )
+        .returning(ChunkBlob.content_hash, literal_column("xmax = 0").label("created"))
+    )
+    created = {row.content_hash for row in result if row.created}
+
+    needed = {content_hash for content_hash in refs if content_hash in created or not chunk_store.exists(content_hash)}
+    # Checked before placing anything, a batch is stored whole or not at all
+    staged = {stored.checksum for stored in stored_chunks if stored.staged is not None}
+    if needed - staged:
+        raise ChunkPayloadGoneException()
+
+    for stored in stored_chunks:
+        if stored.checksum in needed and stored.staged is not None:
+            await record_stored_size(session, stored, await chunk_store.persist(stored))
+            needed.discard(stored.checksum)
+        else:
+            await chunk_store.discard(stored)
+
+
+async def save_chunks(
+    session: AsyncSession,
+    chunks: List[Tuple[int, int, StoredChunk, Optional[int]]],
+) -> Set[Tuple[int, int]]:
+    """
+    Bulk form of `save_chunk` for (file_id, sequence_number, stored, offset)
+    entries with distinct keys. Every chunk is recorded by a single upsert,
+    and the (file_id, sequence_number) keys whose payload changed are
+    returned. Unchanged chunks are discarded from the store.
+    """
+    if not chunks:
+        return set()
+
+    # Evaluated against the statement snapshot, so it yields each row's checksum before the upsert.
+    # SQLAlchemy does not correlate into RETURNING, the returned row is referenced by name.
+    existing = aliased(Chunk)
+    previous = (
+        select(existing.checksum)
+        .where(
+            existing.file_id == literal_column("chunks.file_id"),
+            existing.sequence_number == literal_column("chunks.sequence_number"),
+            existing.data.is_(None),
+        )
+        .scalar_subquery()
+    )
+    stmt = insert(Chunk).values([
+        {
+            "file_id": file_id,
+            "sequence_number": sequence_number,
+            "offset": offset,
+            "length": stored.length,
+            "checksum": stored.checksum,
+            "crc32c": stored.crc32c,
+            "is_received": True,
+        }
+        for file_id, sequence_number, stored, offset in chunks
+    ])
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Chunk.file_id, Chunk.sequence_number],
+            set_={
+                "offset": stmt.excluded.offset,
+                "length": stmt.excluded.length,
+                "checksum": stmt.excluded.checksum,
+                "crc32c": stmt.excluded.crc32c,
+                "is_received": True,
+                "data": None,
+                "edited_at": func.now(),
+            },
+            where=or_(Chunk.checksum.is_distinct_from(stmt.excluded.checksum), Chunk.data.is_not(None)),
+        )
+        .returning(Chunk.file_id, Chunk.sequence_number, previous.label("previous_checksum"))
+    )
+    rows = result.all()
+    changed = {(row.file_id, row.sequence_number) for row in rows}
+
+    referenced = []
+    for file_id, sequence_number, stored, _ in chunks:
+        if (file_id, sequence_number) in changed:
+            referenced.append(stored)
+        else:
+            # The same payload is already recorded for this chunk
+            await chunk_store.discard(stored)
+    await add_blob_references(session, referenced)
+
+    previous_refs = Counter(row.previous_checksum for row in rows if row.previous_checksum is not None)
+    if previous_refs:
+        released = values(
+            column("content_hash", String), column("refs", Integer), name="released"
+        ).data(sorted(previous_refs.items()))
+        await session.execute(
+            update(ChunkBlob)
+            .where(ChunkBlob.content_hash == released.c.content_hash)
+            .values(ref_count=ChunkBlob.ref_count - released.c.refs)
+            .execution_options(synchronize_session=False)
+        )
+    return changed
+
+
+def chunk_references(file_ids: List[int]):
+    # Blob references held by the chunks of the given files, per content hash
+    return (
+        select(Chunk.checksum.label("content_hash"), func.count().label("refs"))
+        .where(Chunk.file_id.in_(file_ids), Chunk.data.is_(None), Chunk.checksum.is_not(None))
+        .group_by(Chunk.checksum)
+    )
+
+
+async def release_file_chunks(session: AsyncSession, file_ids: List[int]) -> List[str]:
+    """
+    Drops the blob references held by the chunks of the given files, before
+    the files are deleted. Returns the content hashes that were released so
+    they can be handed to `collect_chunk_blobs` after commit.
+    """
+    released = chunk_references(file_ids).subquery()
+    result = await session.execute(
+        update(ChunkBlob)
+        .where(ChunkBlob.content_hash == released.c.content_hash)
+        .values(ref_count=ChunkBlob.ref_count - released.c.refs)
+        .returning(ChunkBlob.content_hash)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalars().all()
+
+
+async def collect_chunk_blobs(content_hashes: List[str]) -> int:
+    """
+    Deletes the blobs among `content_hashes` that are no longer referenced and
+    returns the number of bytes reclaimed. Payloads are unlinked before the
+    rows are committed, so an upload adding a new reference waits on the row
+    lock and then stores its own copy.
+
+    Inside a request this runs in, and commits, the request's session, so
+    callers hand over what `release_file_chunks` returned only once their
+    own changes are committed. Elsewhere it uses a session of its own.
+    """
+    if not content_hashes:
+        return 0
+    async with get_async_session() as session:
+        result = await session.execute(
+            delete(ChunkBlob)
+            .where(ChunkBlob.content_hash.in_(content_hashes), ChunkBlob.ref_count <= 0)
+            .returning(ChunkBlob.content_hash, ChunkBlob.size)
+            .execution_options(synchronize_session=False)
+        )
+        collected = result.all()
+        for blob in collected:
+            await chunk_store.delete(blob.content_hash)
+        await session.commit()
+    return sum(blob.size for blob in collected)
+
+
+async def remove_assembled_files(files: List[Tuple[int, str]]) -> None:
+    """
+    Unlinks the rebuilt copies of deleted files, given as (file_id, file_name)
+    pairs, once the delete is committed. Signed links are checked without the
+    database, so until then they would keep serving a deleted file.
+    """
+    for file_id, file_name in files:
+        await run_in_threadpool(assembled_file_path(file_id, file_name).unlink, missing_ok=True)
+
+
+async def index_chunk_offsets(session: AsyncSession, file_id: int) -> None:
+    """
+    Stores each chunk's byte offset in the rebuilt file, derived from the
+    lengths of the chunks that precede it.
+    """
+    ordered = (
+        select(
+            Chunk.chunk_id,
+            (func.sum(Chunk.length).over(order_by=Chunk.sequence_number) - Chunk.length).label("offset"),
+        )
+        .where(Chunk.file_id == file_id)
+        .subquery()
+    )
+    await session.execute(
+        update(Chunk)
+        .where(Chunk.chunk_id == ordered.c.chunk_id)
+        .values(offset=ordered.c.offset)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def chunk_span_page(file_id: int, start: int, stop: int, page_size: int, after: Optional[int] = None):
+    """
+    A page of the chunks overlapping bytes [start, stop) of a completed file,
+    in order. The first page begins with the last chunk starting at or before
+    `start`, found through the (file_id, offset) index, the next ones after
+    the offset of the previous page's last chunk.
+    """
+    if after is None:
+        containing = (
+            select(Chunk.offset)
+            .where(Chunk.file_id == file_id, Chunk.offset <= start)
+            .order_by(Chunk.offset.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        lower_bound = Chunk.offset >= func.coalesce(containing, 0)
+    else:
+        lower_bound = Chunk.offset > after
+    return (
+        select(
+            Chunk.offset,
+            func.coalesce(Chunk.length, func.octet_length(Chunk.data)).label("length"),
+            Chunk.checksum,
+            Chunk.data,
+        )
+        .where(Chunk.file_id == file_id, Chunk.offset < stop, lower_bound)
+        .order_by(Chunk.offset)
+        .limit(page_size)
+    )
+
+
+async def iter_chunk_spans(file_id: int, start: int, stop: int, page_size: int = 256):
+    """
+    Yields the chunks of a completed file overlapping bytes [start, stop), in
+    order, a `chunk_span_page` at a time. Each page is fetched in a session of
+    its own, so no connection is held while the bytes go out.
+    """
+    after = None
+    while True:
+        async with get_async_session() as session:
+            result = await session.execute(chunk_span_page(file_id, start, stop, page_size, after))
+            rows = result.all()
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        after = rows[-1].offset
+
+
+async def mark_chunk_received(session: AsyncSession, upload_id: UUID, sequence_number: int) -> int:
+    """
+    Sets the chunk's bit in the session bitmap and returns how many distinct
+    chunks have been received. The row update is atomic, so chunks of the same
+    upload can arrive in parallel and in any order.
+    """
+    result = await session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id)
+        .values(
+            received=func.set_bit(UploadSession.received, sequence_number, 1),
+            received_count=UploadSession.received_count + 1 - func.get_bit(UploadSession.received, sequence_number),
+        )
+        .returning(UploadSession.received_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar_one()
+
+
+def reserved_space(user_id: UUID):
+    # Bytes of the user's upload sessions that are still open, charged only once complete
+    return (
+        select(func.coalesce(func.sum(File.size), 0))
+        .where(File.user_id == user_id, File.is_complete.is_not(True), File.upload_session.has())
+        .scalar_subquery()
+    )
+
+
+async def space_left(session: AsyncSession, user_id: UUID) -> int:
+    """
+    Bytes the user may still upload before reaching `max_space`, with the
+    size of every open upload session already set aside.
+    """
+    result = await session.execute(
+        select(User.max_space - User.space - reserved_space(user_id)).where(User.id == user_id)
+    )
+    return result.scalar_one()
+
+
+async def charge_space(session: AsyncSession, user_id: UUID, size: int) -> None:
+    """
+    Adds `size` to the user's used space, or raises
+    StorageQuotaExceededException when that would pass `max_space`. The
+    check and the update are one row update, so concurrent completions
+    cannot overrun the quota together.
+    """
+    result = await session.execute(
+        update(User)
+        .where(User.id == user_id, User.space + size <= User.max_space)
+        .values(space=User.space + size)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is None:
+        raise StorageQuotaExceededException()
+
+
+async def complete_upload(
+    session: AsyncSession,
+    file_id: int,
+    user_id: UUID,
+    background_tasks: BackgroundTasks,
+) -> bool:
+    """
+    Flags the file as complete, charges its size to the owner and schedules the
+    rebuild once the caller commits. Returns False if another request already
+    completed the file. Quota is only reserved while an upload is open, so
+    the completion fails with StorageQuotaExceededException when the owner
+    has run out of space since.
+    """
+    result = await session.execute(
+        update(File)
+        .where(File.file_id == file_id, File.is_complete.is_not(True))
+        .values(is_complete=True)
+        .returning(File.file_name, File.size)
+        .execution_options(synchronize_session=False)
+    )
+    completed = result.one_or_none()
+    if completed is None:
+        return False
+
+    await charge_space(session, user_id, completed.size)
+    background_tasks.add_task(retrieve_and_trigger_celery, {"file_id": file_id, "file_name": completed.file_name})
+    return True
@@ -1,38 +1,530 @@
-import asyncio
-from sqlalchemy import select
-from app.models import Chunk
+import hashlib
+import mmap
+import os
+from collections import Counter
+from datetime import timedelta
+from celery import chord
+from celery.utils.log import get_task_logger
+from sqlalchemy import select, update, delete, func, literal_column, any_, values, column, String, Integer
+from sqlalchemy.orm import aliased
+from app.models import Chunk, ChunkBlob, File, UploadSession
 from app.core.celery_config import celery_app
-from pathlib import Path
-from app.core.db import get_async_session
+from app.core.config import config
+from app.core.db.session import SyncSessionLocal
+from app.core.storage import chunk_store, assembled_file_path
+
+logger = get_task_logger(__name__)
 
 
 # In your FastAPI background task function
 async def retrieve_and_trigger_celery(params):
-    file_id = params.get("file_id")
-    file_name = params.get("file_name")
-    async with get_async_session() as session:
-        result = await session.execute(
-            select(Chunk).where(Chunk.file_id == file_id).order_by(Chunk.sequence_number)
+    # Only the id travels through the broker, the worker streams the chunks itself
+    rebuild_file.delay(params.get("file_id"))
+
+
+def write_all(target_fd, data) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(target_fd, view):]
+
+
+def copy_buffered(source_fd, target_fd, offset, count, digest=None) -> int:
+    block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+    copied = 0
+    while copied < count:
+        block = os.pread(source_fd, min(block_size, count - copied), offset + copied)
+        if not block:
+            break
+        if digest is not None:
+            digest.update(block)
+        write_all(target_fd, block)
+        copied += len(block)
+    return copied
+
+
+def copy_stream(source, target_fd, digest=None) -> int:
+    block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+    copied = 0
+    while True:
+        block = source.read(block_size)
+        if not block:
+            break
+        if digest is not None:
+            digest.update(block)
+        write_all(target_fd, block)
+        copied += len(block)
+    return copied
+
+
+def copy_file_range(source_fd, target_fd, offset, count) -> int:
+    # Stays in the kernel, and becomes a reflink on filesystems that support it (XFS, btrfs)
+    return os.copy_file_range(source_fd, target_fd, count, offset)
+
+
+def sendfile(source_fd, target_fd, offset, count) -> int:
+    return os.sendfile(target_fd, source_fd, offset, count)
+
+
+ASSEMBLY_STRATEGIES = {
+    "copy_file_range": copy_file_range,
+    "sendfile": sendfile,
+    "buffered": copy_buffered,
+}
+
+
+def hash_file(source_fd, count, digest) -> None:
+    # Hashes straight from the page cache, nothing is copied into Python bytes
+    if not count:
+        return
+    with mmap.mmap(source_fd, count, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            digest.update(view)
+
+
+def assemble_chunk(source_fd, target_fd, count, digest, strategy) -> int:
+    """
+    Appends `count` bytes of the source to the target with the given strategy
+    and updates `digest` with them. Kernel side strategies fall back to a
+    buffered copy where the kernel or filesystem does not support them.
+    """
+    copy = ASSEMBLY_STRATEGIES.get(strategy, copy_buffered)
+    # Kernel strategies are named after their os function, which some platforms lack
+    if copy is copy_buffered or not hasattr(os, strategy):
+        return copy_buffered(source_fd, target_fd, 0, count, digest)
+
+    if digest is not None:
+        hash_file(source_fd, count, digest)
+    copied = 0
+    while copied < count:
+        try:
+            written = copy(source_fd, target_fd, copied, count - copied)
+        except OSError:
+            return copied + copy_buffered(source_fd, target_fd, copied, count - copied)
+        if not written:
+            break
+        copied += written
+    return copied
+
+
+def chunk_listing(file_id, *criteria):
+    # The file's chunks in order, without their inline payloads
+    return (
+        select(Chunk.chunk_id, Chunk.offset, Chunk.checksum, Chunk.data.is_not(None).label("is_inline"))
+        .where(Chunk.file_id == file_id, *criteria)
+        .order_by(Chunk.sequence_number)
+    )
+
+
+def chunk_rows(db, file_id, *criteria):
+    return db.execute(chunk_listing(file_id, *criteria).execution_options(yield_per=1000))
+
+
+def copy_chunk(db, chunk, target_fd, digest) -> int:
+    # Chunks uploaded before the chunk store existed still carry their payload inline
+    if chunk.is_inline:
+        data = db.execute(select(Chunk.data).where(Chunk.chunk_id == chunk.chunk_id)).scalar_one()
+        if digest is not None:
+            digest.update(data)
+        write_all(target_fd, data)
+        return len(data)
+    if chunk_store.is_compressed(chunk.checksum):
+        # Decompressed block by block, the kernel cannot copy these
+        with chunk_store.open(chunk.checksum) as source:
+            return copy_stream(source, target_fd, digest)
+    with chunk_store.open(chunk.checksum) as source:
+        count = os.fstat(source.fileno()).st_size
+        return assemble_chunk(source.fileno(), target_fd, count, digest, config.ASSEMBLY_STRATEGY)
+
+
+def partial_file_path(file_path):
+    # Hidden while incomplete, the /Uploads mount never serves a partial file
+    return file_path.with_name(f".{file_path.name}.part")
+
+
+def plan_segments(db, file_id, size, segments):
+    """
+    Splits the file's chunks into about `segments` contiguous ranges of
+    similar byte size, as (first, last) sequence numbers. Returns None when
+    chunk offsets are unknown.
+    """
+    rows = db.execute(
+        select(Chunk.sequence_number, Chunk.offset)
+        .where(Chunk.file_id == file_id)
+        .order_by(Chunk.sequence_number)
+    ).all()
+    if not rows or any(row.offset is None for row in rows):
+        return None
+
+    segment_size = -(-size // segments)
+    ranges = []
+    first = rows[0].sequence_number
+    boundary = segment_size
+    for previous, row in zip(rows, rows[1:]):
+        if row.offset >= boundary:
+            ranges.append((first, previous.sequence_number))
+            first = row.sequence_number
+            boundary = row.offset + segment_size
+    ranges.append((first, rows[-1].sequence_number))
+    return ranges
+
+
+def preallocate(path, size) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            # Filesystems without fallocate still get a sparse file of the right size
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+@celery_app.task
+def rebuild_file(file_id, *_, serial=False):
+    """
+    Writes Uploads/{file_id}-{file_name} from the file's chunks. Chunks are
+    read through a server-side cursor and appended with the configured
+    ASSEMBLY_STRATEGY, so memory stays bounded whatever the file size. Files
+    of PARALLEL_REBUILD_MIN_SIZE and more are handed to `rebuild_segment`
+    tasks instead. Extra positional arguments sent by tasks queued before
+    this signature are ignored.
+    """
+    with SyncSessionLocal() as db:
+        file_db = db.get(File, file_id)
+        if file_db is None:
+            return {"status": "File not found"}
+
+        file_path = assembled_file_path(file_id, file_db.file_name)
+        if file_db.is_ready and file_path.exists():
+            # Its chunks may already be released, rebuilding again could only lose data
+            return {"status": "File already rebuilt"}
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = partial_file_path(file_path)
+
+        if not serial and file_db.size and file_db.size >= int(config.PARALLEL_REBUILD_MIN_SIZE):
+            segments = plan_segments(db, file_id, file_db.size, int(config.REBUILD_SEGMENTS))
+            if segments and len(segments) > 1:
+                preallocate(partial_path, file_db.size)
+                # The partial file is dropped whatever happens to the segments, nothing else would reclaim it
+                chord(
+                    [rebuild_segment.s(file_id, first, last) for first, last in segments]
+                )(
+                    finalize_rebuild.s(file_id, file_name=file_db.file_name)
+                    .on_error(discard_partial_rebuild.s(file_id, file_db.file_name))
+                )
+                return {"status": f"File rebuild split into {len(segments)} segments"}
+
+        digest = hashlib.sha256()
+        with open(partial_path, 'wb') as target:
+            for chunk in chunk_rows(db, file_id):
+                copy_chunk(db, chunk, target.fileno(), digest)
+        os.replace(partial_path, file_path)
+
+        # The whole-file digest lets identical uploads be completed without a transfer
+        result = db.execute(
+            update(File)
+            .where(File.file_id == file_id)
+            .values(content_hash=digest.hexdigest(), is_ready=True)
         )
-        chunks = result.scalars().all()
+        db.commit()
+        if not result.rowcount:
+            # Deleted while it was being rebuilt
+            file_path.unlink(missing_ok=True)
+            return {"status": "File not found"}
+
+    verify_rebuilt_file.delay(file_id)
+    return {"status": "File rebuilt successfully"}
+
+
+@celery_app.task
+def rebuild_segment(file_id, first_sequence, last_sequence):
+    """
+    Writes chunks `first_sequence` to `last_sequence` at their offsets in the
+    preallocated partial file and returns the number of bytes written.
+    """
+    with SyncSessionLocal() as db:
+        file_name = db.execute(select(File.file_name).where(File.file_id == file_id)).scalar_one_or_none()
+        if file_name is None:
+            # Deleted during the rebuild, finalize_rebuild drops the partial file
+            return 0
+        partial_path = partial_file_path(assembled_file_path(file_id, file_name))
 
-    # Ensure that chunk.data is in bytes format
-    chunks_data = [chunk.data if isinstance(chunk.data, bytes) else bytes(chunk.data) for chunk in chunks]
-    rebuild_file.delay(file_id, file_name, chunks_data)
+        written = 0
+        fd = os.open(partial_path, os.O_WRONLY)
+        try:
+            for chunk in chunk_rows(db, file_id, Chunk.sequence_number.between(first_sequence, last_sequence)):
+                os.lseek(fd, chunk.offset, os.SEEK_SET)
+                written += copy_chunk(db, chunk, fd, None)
+        finally:
+            os.close(fd)
+    return written
 
 
-# In your Celery taskSELE
 @celery_app.task
-def rebuild_file(file_id, file_name, chunks_data):
-    # Join the bytes-like objects in chunks_data
-    file_data = b''.join(chunks_data)
+def finalize_rebuild(written, file_id, file_name=None):
+    """
+    Chord callback of the segment tasks. Publishes the file once every byte
+    has been written and hands it to `verify_rebuilt_file`. `file_name` finds
+    the partial file of a file deleted during the rebuild; callbacks queued
+    before it was passed do without.
+    """
+    with SyncSessionLocal() as db:
+        file_db = db.get(File, file_id)
+        if file_db is None:
+            if file_name is not None:
+                partial_file_path(assembled_file_path(file_id, file_name)).unlink(missing_ok=True)
+            return {"status": "File not found"}
+        file_path = assembled_file_path(file_id, file_db.file_name)
+        partial_path = partial_file_path(file_path)
 
-    root_dir = Path(__file__).parent.parent.parent.parent
-    uploads_path = root_dir / 'Uploads'
-    uploads_path.mkdir(parents=True, exist_ok=True)
-    file_path = uploads_path / f"{file_id}-{file_name}"
+        if sum(written) != file_db.size:
+            # Chunk metadata disagrees with the announced size, let the serial rebuild write what is there
+            partial_path.unlink(missing_ok=True)
+            rebuild_file.apply_async((file_id,), {"serial": True})
+            return {"status": f"Segments wrote {sum(written)} of {file_db.size} bytes, rebuilding serially"}
 
-    with open(file_path, 'wb') as file:
-        file.write(file_data)
+        os.replace(partial_path, file_path)
+        result = db.execute(update(File).where(File.file_id == file_id).values(is_ready=True))
+        db.commit()
+        if not result.rowcount:
+            # Deleted since it was read above
+            file_path.unlink(missing_ok=True)
+            return {"status": "File not found"}
 
+    # Segments were written out of order, the digest comes from the verification pass
+    verify_rebuilt_file.delay(file_id)
     return {"status": "File rebuilt successfully"}
+
+
+@celery_app.task
+def discard_partial_rebuild(request, exc, traceback, file_id, file_name):
+    """
+    Error callback of the parallel rebuild chord: a failed segment leaves a
+    preallocated partial file that no later rebuild would remove.
+    """
+    logger.error("Parallel rebuild of file %s failed: %r", file_id, exc)
+    partial_file_path(assembled_file_path(file_id, file_name)).unlink(missing_ok=True)
+
+
+def hash_range(fd, offset, count, *digests) -> int:
+    block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+    done = 0
+    while done < count:
+        block = os.pread(fd, min(block_size, count - done), offset + done)
+        if not block:
+            break
+        for digest in digests:
+            digest.update(block)
+        done += len(block)
+    return done
+
+
+def verify_assembled_file(db, file_id, file_path, size):
+    """
+    Reads the assembled file back once and checks it against the chunks it
+    was built from: the total size, and the SHA-256 of every chunk's byte
+    range. Returns the whole-file SHA-256 computed in the same pass, or None
+    when anything differs.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as assembled:
+        fd = assembled.fileno()
+        if os.fstat(fd).st_size != size:
+            return None
+        # On disk for good before the chunks, the other copy, can be dropped
+        os.fsync(fd)
+
+        position = 0
+        rows = db.execute(
+            select(
+                func.coalesce(Chunk.length, func.octet_length(Chunk.data)).label("length"),
+                # Inline chunks from before checksums were recorded are hashed by Postgres
+                func.coalesce(Chunk.checksum, func.encode(func.sha256(Chunk.data), 'hex')).label("checksum"),
+            )
+            .where(Chunk.file_id == file_id)
+            .order_by(Chunk.sequence_number)
+            .execution_options(yield_per=1000)
+        )
+        for row in rows:
+            if row.length is None or row.checksum is None:
+                return None
+            chunk_digest = hashlib.sha256()
+            if hash_range(fd, position, row.length, chunk_digest, digest) != row.length:
+                return None
+            if chunk_digest.hexdigest() != row.checksum:
+                return None
+            position += row.length
+    return digest.hexdigest() if position == size else None
+
+
+@celery_app.task
+def verify_rebuilt_file(file_id):
+    """
+    Post-rebuild finalization. Verifies the assembled file against its
+    chunks and records its digest, then, with RELEASE_REBUILT_CHUNKS, drops
+    the chunk rows and blob references in batches. Chunks are only touched
+    once the file is verified and synced, so a crash at any point leaves at
+    least one complete copy; a rerun deletes whatever remains. A file that
+    fails verification keeps its chunks and is no longer marked ready.
+    """
+    counts = Counter()
+    with SyncSessionLocal() as db:
+        file_db = db.get(File, file_id)
+        if file_db is None or not file_db.is_ready:
+            return {"status": "File is not rebuilt"}
+
+        file_path = assembled_file_path(file_id, file_db.file_name)
+        try:
+            digest = verify_assembled_file(db, file_id, file_path, file_db.size)
+        except FileNotFoundError:
+            digest = None
+        if digest is None or (file_db.content_hash is not None and digest != file_db.content_hash):
+            logger.error("Rebuilt file %s does not match its chunks, keeping them", file_id)
+            db.execute(update(File).where(File.file_id == file_id).values(is_ready=False))
+            db.commit()
+            return {"status": "Rebuilt file does not match its chunks"}
+
+        if file_db.content_hash is None:
+            db.execute(update(File).where(File.file_id == file_id).values(content_hash=digest))
+        db.commit()
+        if not config.RELEASE_REBUILT_CHUNKS:
+            return {"status": "File verified"}
+
+        # Rechecked by every batch, a file found bad in the meantime keeps what is left
+        ready = select(File.file_id).where(File.file_id == file_id, File.is_ready.is_(True))
+        released = drop_chunks(db, Chunk.file_id.in_(ready), counts)
+        counts["reclaimed_bytes"] = collect_blobs(db, released)
+
+    logger.info(
+        "Released %d chunks (%d bytes) of rebuilt file %s, %d bytes reclaimed from the chunk store",
+        counts["chunks"], counts["chunk_bytes"], file_id, counts["reclaimed_bytes"],
+    )
+    return {"status": "File verified", **counts}
+
+
+def release_blob_refs(db, refs: Counter) -> None:
+    if not refs:
+        return
+    released = values(
+        column("content_hash", String), column("refs", Integer), name="released"
+    ).data(sorted(refs.items()))
+    db.execute(
+        update(ChunkBlob)
+        .where(ChunkBlob.content_hash == released.c.content_hash)
+        .values(ref_count=ChunkBlob.ref_count - released.c.refs)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def collect_blobs(db, content_hashes) -> int:
+    """
+    Sync counterpart of `collect_chunk_blobs` for workers. Deletes the
+    unreferenced blobs among `content_hashes` and returns the bytes freed.
+    """
+    reclaimed = 0
+    content_hashes = sorted(content_hashes)
+    batch_size = int(config.SWEEP_BATCH_SIZE)
+    for start in range(0, len(content_hashes), batch_size):
+        collected = db.execute(
+            delete(ChunkBlob)
+            .where(ChunkBlob.content_hash.in_(content_hashes[start:start + batch_size]), ChunkBlob.ref_count <= 0)
+            .returning(ChunkBlob.content_hash, func.coalesce(ChunkBlob.stored_size, ChunkBlob.size).label("size"))
+            .execution_options(synchronize_session=False)
+        ).all()
+        # Unlinked before commit, like collect_chunk_blobs, so a new reference waits and stores its own copy
+        for blob in collected:
+            chunk_store.unlink(blob.content_hash)
+        db.commit()
+        reclaimed += sum(blob.size for blob in collected)
+    return reclaimed
+
+
+def drop_chunks(db, criteria, counts: Counter) -> set:
+    """
+    Deletes the chunk rows matching `criteria`, SWEEP_BATCH_SIZE rows per
+    transaction. Each batch drops the blob references it held in the same
+    transaction. Adds to `counts` and returns the released content hashes,
+    for `collect_blobs`.
+    """
+    batch_size = int(config.SWEEP_BATCH_SIZE)
+    released = set()
+    while True:
+        doomed = select(literal_column("ctid")).select_from(Chunk).where(criteria).limit(batch_size)
+        rows = db.execute(
+            delete(Chunk)
+            # = ANY(ARRAY(...)) lets Postgres fetch the rows by TID instead of scanning chunks
+            .where(literal_column("ctid") == any_(func.array(doomed.scalar_subquery())))
+            .returning(
+                Chunk.checksum,
+                Chunk.data.is_(None).label("in_store"),
+                func.coalesce(Chunk.length, func.octet_length(Chunk.data), 0).label("size"),
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            return released
+        refs = Counter(row.checksum for row in rows if row.in_store and row.checksum)
+        release_blob_refs(db, refs)
+        db.commit()
+        released.update(refs)
+        counts["chunks"] += len(rows)
+        counts["chunk_bytes"] += sum(row.size for row in rows)
+
+
+def abandoned_files(cutoff):
+    # Incomplete files untouched since the cutoff, by their own row, their chunks or their upload session
+    recent_chunk = aliased(Chunk)
+    recent_session = aliased(UploadSession)
+    return select(File.file_id).where(
+        File.is_complete.is_not(True),
+        File.edited_at < cutoff,
+        ~select(recent_chunk.chunk_id)
+        .where(recent_chunk.file_id == File.file_id, recent_chunk.edited_at >= cutoff)
+        .exists(),
+        ~select(recent_session.id)
+        .where(recent_session.file_id == File.file_id, recent_session.edited_at >= cutoff)
+        .exists(),
+    )
+
+
+@celery_app.task
+def sweep_abandoned_uploads():
+    """
+    Deletes uploads that never completed and saw no activity for
+    ABANDONED_UPLOAD_MAX_AGE seconds. Rows go in batches of SWEEP_BATCH_SIZE,
+    each batch in its own short transaction, so neither uploads nor readers
+    wait on long held locks. Scheduled by celery beat.
+    """
+    cutoff = func.now() - timedelta(seconds=int(config.ABANDONED_UPLOAD_MAX_AGE))
+    batch_size = int(config.SWEEP_BATCH_SIZE)
+    swept = Counter()
+
+    with SyncSessionLocal() as db:
+        released = drop_chunks(db, Chunk.file_id.in_(abandoned_files(cutoff)), swept)
+
+        while True:
+            file_ids = db.execute(
+                abandoned_files(cutoff)
+                .where(~select(Chunk.chunk_id).where(Chunk.file_id == File.file_id).exists())
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not file_ids:
+                break
+            db.execute(
+                delete(UploadSession)
+                .where(UploadSession.file_id.in_(file_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.execute(delete(File).where(File.file_id.in_(file_ids)).execution_options(synchronize_session=False))
+            db.commit()
+            swept["files"] += len(file_ids)
+
+        swept["reclaimed_bytes"] = collect_blobs(db, released)
+
+    logger.info(
+        "Swept %d abandoned uploads: %d chunks, %d chunk bytes, %d bytes reclaimed from the chunk store",
+        swept["files"], swept["chunks"], swept["chunk_bytes"], swept["reclaimed_bytes"],
+    )
+    return dict(swept)
@@ -0,0 +1,67 @@
+import time
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select, func
+
+from app.core.config import config
+from app.core.db import get_async_session, engines, pool_status
+from app.core.db.routing import replica_lag
+from app.core.dependencies import HasMetricsToken, PermissionDependency, upload_admission
+from app.core.storage import chunk_store
+from app.models import ChunkBlob
+
+metrics_router = APIRouter()
+
+
+# Last storage totals and when they go stale, shared by the scrapes of this process
+storage_totals = {"expires": 0.0, "totals": None}
+
+
+async def get_storage_totals() -> dict:
+    """
+    Logical and stored size of all chunk payloads. Summing them reads the
+    whole chunk_blobs table, so the result is reused for
+    METRICS_STORAGE_TTL seconds.
+    """
+    if storage_totals["totals"] is not None and time.monotonic() < storage_totals["expires"]:
+        return storage_totals["totals"]
+
+    async with get_async_session() as session:
+        totals = await session.execute(
+            select(
+                func.coalesce(func.sum(ChunkBlob.size), 0).label("logical_bytes"),
+                func.coalesce(func.sum(func.coalesce(ChunkBlob.stored_size, ChunkBlob.size)), 0).label("stored_bytes"),
+                func.count().filter(ChunkBlob.stored_size.is_not(None)).label("compressed_blobs"),
+                func.count().label("blobs"),
+            )
+        )
+        totals = totals.one()
+
+    storage_totals["totals"] = dict(totals._mapping)
+    storage_totals["expires"] = time.monotonic() + float(config.METRICS_STORAGE_TTL)
+    return storage_totals["totals"]
+
+
+@metrics_router.get("", dependencies=[Depends(PermissionDependency([HasMetricsToken]))])
+async def get_metrics():
+    """
+    Counters of this API process, for scraping and dashboards, behind the
+    METRICS_TOKEN bearer token. `storage` compares the logical size of all
+    chunk payloads with what they take in the chunk store, as of at most
+    METRICS_STORAGE_TTL seconds ago. `database` shows each engine's
+    connection pool, taken before this request checks out a connection of
+    its own, and `replica` the reader's lag and where reads were routed.
+    """
+    database = {name: pool_status(engine.sync_engine) for name, engine in engines.items()}
+    totals = await get_storage_totals()
+
+    return {
+        "admission": upload_admission.snapshot(),
+        "database": database,
+        "replica": replica_lag.snapshot(),
+        "storage": {
+            **totals,
+            # Persisted by this process since it started
+            "process": dict(getattr(chunk_store, "stats", {})),
+        },
+    }
@@ -0,0 +1,341 @@
+import base64
+import binascii
+from typing import Dict, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, status
+from fastapi.responses import Response
+from sqlalchemy import select, update, func
+
+from app.api.file_uploads.services import (
+    save_chunk,
+    complete_upload,
+    release_file_chunks,
+    collect_chunk_blobs,
+    remove_assembled_files,
+    space_left,
+)
+from app.core.config import config
+from app.core.dependencies import AdmissionRoute
+from app.core.db import get_async_session
+from app.core.exceptions import CustomException, UnauthorizedException
+from app.core.storage import (
+    CHECKSUM_ALGORITHMS,
+    ChunkChecksum,
+    RequestBodyParts,
+    chunk_store,
+    is_compressible,
+    make_chunk_checksum,
+    make_digest,
+)
+from app.models import File, User, Folder, UploadSession
+
+tus_router = APIRouter(route_class=AdmissionRoute)
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination,checksum"
+# tus checksum extension status for a body that does not match Upload-Checksum
+CHECKSUM_MISMATCH = 460
+
+
+def tus_headers(**headers) -> Dict[str, str]:
+    headers = {name.replace("_", "-"): str(value) for name, value in headers.items()}
+    headers["Tus-Resumable"] = TUS_VERSION
+    return headers
+
+
+def check_tus_version(request: Request) -> None:
+    if request.headers.get("Tus-Resumable") != TUS_VERSION:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Unsupported tus version",
+            headers={"Tus-Version": TUS_VERSION},
+        )
+
+
+def parse_upload_metadata(header: str) -> Dict[str, str]:
+    """
+    Decodes `Upload-Metadata`, comma separated pairs of a key and an optional
+    base64 encoded value.
+    """
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in header.split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode() if value else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Upload-Metadata value for {key}", headers=tus_headers())
+    return metadata
+
+
+def parse_int_header(request: Request, name: str) -> int:
+    try:
+        value = int(request.headers[name])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} header is required", headers=tus_headers())
+    if value < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} must not be negative", headers=tus_headers())
+    return value
+
+
+def parse_upload_checksum(header: Optional[str]) -> Optional[ChunkChecksum]:
+    """
+    Decodes `Upload-Checksum`, an algorithm name and the base64 encoded digest.
+    """
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(" ")
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except binascii.Error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Upload-Checksum", headers=tus_headers())
+    try:
+        return make_chunk_checksum(algorithm, digest.hex())
+    except CustomException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message, headers=tus_headers())
+
+
+async def get_tus_upload(session, upload_id, user_id):
+    result = await session.execute(
+        select(UploadSession, File)
+        .join(File, File.file_id == UploadSession.file_id)
+        .where(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found", headers=tus_headers())
+    return row
+
+
+@tus_router.options("")
+async def tus_options():
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers=tus_headers(
+            Tus_Version=TUS_VERSION,
+            Tus_Extension=TUS_EXTENSIONS,
+            Tus_Checksum_Algorithm=",".join(CHECKSUM_ALGORITHMS),
+        ),
+    )
+
+
+@tus_router.post("")
+async def create_tus_upload(request: Request, background_tasks: BackgroundTasks):
+    """
+    tus creation: `Upload-Length` gives the file size and `Upload-Metadata`
+    carries `filename`, `filetype` and an optional `folder_id`. An empty file
+    has no PATCH to wait for and is complete once created.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    check_tus_version(request)
+
+    upload_length = parse_int_header(request, "Upload-Length")
+    metadata = parse_upload_metadata(request.headers.get("Upload-Metadata", ""))
+    file_name = metadata.get("filename") or metadata.get("name")
+    if not file_name:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="filename metadata is required", headers=tus_headers())
+
+    async with get_async_session() as session:
+        if upload_length > await space_left(session, current_user.id):
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Not enough storage space left",
+                headers=tus_headers(),
+            )
+
+        folder_db = None
+        if metadata.get("folder_id"):
+            try:
+                folder_id = UUID(metadata["folder_id"])
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid folder_id", headers=tus_headers())
+            folder_db = await session.execute(
+                select(Folder).where(Folder.id == folder_id, Folder.user_id == current_user.id)
+            )
+            folder_db = folder_db.scalar_one_or_none()
+
+        file_db = File(
+            user_id=current_user.id,
+            file_name=file_name,
+            size=upload_length,
+            total_chunks=0,
+            is_complete=False,
+            file_type=metadata.get("filetype") or metadata.get("type"),
+            folder_id=folder_db.id if folder_db is not None else None
+        )
+        session.add(file_db)
+        await session.flush()
+
+        # Chunks are whatever each PATCH carries, chunk_size only bounds them
+        upload = UploadSession(
+            file_id=file_db.file_id,
+            user_id=current_user.id,
+            chunk_size=int(config.UPLOAD_MAX_CHUNK_SIZE),
+            received=b"",
+            received_count=0,
+            received_bytes=0,
+        )
+        session.add(upload)
+        await session.flush()
+        if not upload_length:
+            await complete_upload(session, file_db.file_id, current_user.id, background_tasks)
+        # Committing expires upload
+        location = request.url_for("tus_upload_offset", upload_id=upload.id)
+        await session.commit()
+
+    return Response(status_code=status.HTTP_201_CREATED, headers=tus_headers(Location=location))
+
+
+@tus_router.head("/{upload_id}", name="tus_upload_offset")
+async def tus_upload_offset(request: Request, upload_id: UUID):
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    check_tus_version(request)
+
+    async with get_async_session() as session:
+        upload, file_db = await get_tus_upload(session, upload_id, current_user.id)
+
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers=tus_headers(Upload_Offset=upload.received_bytes, Upload_Length=file_db.size, Cache_Control="no-store"),
+    )
+
+
+async def record_tus_chunks(upload_id, file_id, size, offset, parts, user_id, background_tasks) -> int:
+    """
+    Records staged `parts` as the upload's next chunks, from `offset` on, in
+    one short transaction, and completes the file when they reach its end.
+    Returns the new offset.
+    """
+    length = sum(stored.length for stored in parts)
+    async with get_async_session() as session:
+        # Claims the range first, a concurrent PATCH at the same offset waits on the row and then conflicts
+        result = await session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_id, UploadSession.received_bytes == offset)
+            .values(
+                received_bytes=UploadSession.received_bytes + length,
+                received_count=UploadSession.received_count + len(parts),
+            )
+            .returning(UploadSession.received_count)
+            .execution_options(synchronize_session=False)
+        )
+        received_count = result.scalar_one_or_none()
+        if received_count is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload-Offset does not match", headers=tus_headers())
+
+        sequence_number = received_count - len(parts)
+        for stored in parts:
+            await save_chunk(session, file_id, sequence_number, stored, offset=offset)
+            sequence_number += 1
+            offset += stored.length
+
+        if offset == size:
+            await session.execute(
+                update(File)
+                .where(File.file_id == file_id)
+                .values(total_chunks=received_count)
+                .execution_options(synchronize_session=False)
+            )
+            await complete_upload(session, file_id, user_id, background_tasks)
+
+        await session.commit()
+    return offset
+
+
+@tus_router.patch("/{upload_id}")
+async def tus_upload_patch(request: Request, background_tasks: BackgroundTasks, upload_id: UUID):
+    """
+    Appends the request body at `Upload-Offset`. The body is streamed straight
+    into the chunk store and recorded as chunks of at most the session's
+    chunk size, so clients are free to choose and vary the size of each
+    PATCH, up to the whole file in one request. Every chunk is recorded as
+    soon as it is stored, and when the client disconnects the part that
+    arrived is kept, so a resumed upload continues from there.
+
+    With `Upload-Checksum` the body can only be verified once complete: its
+    chunks are recorded together at the end, and a body that does not
+    match, or was cut short, is dropped. A mismatch is answered with 460.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    check_tus_version(request)
+    if request.headers.get("Content-Type") != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream",
+            headers=tus_headers(),
+        )
+    offset = parse_int_header(request, "Upload-Offset")
+    expected_checksum = parse_upload_checksum(request.headers.get("Upload-Checksum"))
+
+    # No connection is held while the body streams in, only before and after each chunk
+    async with get_async_session() as session:
+        upload, file_db = await get_tus_upload(session, upload_id, current_user.id)
+        file_id, size, file_type = file_db.file_id, file_db.size, file_db.file_type
+        received_bytes, chunk_size = upload.received_bytes, upload.chunk_size
+    if offset != received_bytes:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload-Offset does not match", headers=tus_headers())
+
+    digest = make_digest(expected_checksum.algorithm) if expected_checksum is not None else None
+    body = RequestBodyParts(request, limit=size - offset, digest=digest)
+    staged = []
+    try:
+        while not body.exhausted:
+            stored = await chunk_store.write(body.part(chunk_size), compressible=is_compressible(file_type))
+            staged.append(stored)
+            if not stored.length:
+                continue
+            if expected_checksum is None:
+                offset = await record_tus_chunks(
+                    upload_id, file_id, size, offset, [stored], current_user.id, background_tasks
+                )
+
+        if expected_checksum is not None:
+            if body.disconnected:
+                return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers(Upload_Offset=offset))
+            if digest.hexdigest() != expected_checksum.value:
+                raise HTTPException(status_code=CHECKSUM_MISMATCH, detail="Chunk checksum mismatch", headers=tus_headers())
+            parts = [stored for stored in staged if stored.length]
+            if parts:
+                offset = await record_tus_chunks(
+                    upload_id, file_id, size, offset, parts, current_user.id, background_tasks
+                )
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers(Upload_Offset=offset))
+    finally:
+        for stored in staged:
+            await chunk_store.discard(stored)
+
+
+@tus_router.delete("/{upload_id}")
+async def tus_upload_terminate(request: Request, upload_id: UUID):
+    """
+    tus termination: drops the upload and whatever it stored so far.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+    check_tus_version(request)
+
+    async with get_async_session() as session:
+        upload, file_db = await get_tus_upload(session, upload_id, current_user.id)
+        if file_db.is_complete:
+            await session.execute(
+                update(User)
+                .where(User.id == current_user.id)
+                .values(space=func.greatest(User.space - file_db.size, 0))
+                .execution_options(synchronize_session=False)
+            )
+        # A completed upload may have been rebuilt already
+        deleted = [(file_db.file_id, file_db.file_name)]
+        released = await release_file_chunks(session, [file_db.file_id])
+        await session.delete(file_db)
+        await session.commit()
+
+    await remove_assembled_files(deleted)
+    await collect_chunk_blobs(released)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=tus_headers())
@@ -1,16 +1,20 @@
 from pathlib import Path
 from app.core.config import config
 from fastapi import Request, APIRouter, Depends, HTTPException, status 
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from app.schemas.api_v2_schemas import UserBase, FolderSchemaRequest, UserFoldersResponse
 from app.models import User, File, Folder
 from app.core.db import get_async_session, AsyncTransactional
 from app.core.exceptions import UnauthorizedException
+from app.core.middlewares.authentication import user_by_id
+from app.api.file_uploads.services import release_file_chunks, collect_chunk_blobs, remove_assembled_files
+from app.core.storage import ArchiveEntry, assembled_file_path, is_compressed_type, iter_zip_archive
 import datetime
 from sqlalchemy import func, extract, select
 from sqlalchemy.ext.asyncio import AsyncSession
 import shutil
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from urllib.parse import quote
 
 
 user_router = APIRouter()
@@ -21,6 +25,114 @@ REDIRECT_URI = config.REDIRECT_URI
 TOKEN_URL = config.TOKEN_URL
 USER_INFO_URL = config.USER_INFO_URL
 
+
+def folder_tree_files(folder_id):
+    # Files of the folder and of all its subfolders, walked by a recursive CTE
+    tree = select(Folder.id).where(Folder.id == folder_id).cte(name="folder_tree", recursive=True)
+    tree = tree.union_all(select(Folder.id).where(Folder.parent_id == tree.c.id))
+    return select(File.file_id, File.file_name).where(File.folder_id.in_(select(tree.c.id)))
+
+
+def user_folder(folder_id, user_id):
+    return select(Folder).where(Folder.id == folder_id, Folder.user_id == user_id)
+
+
+def user_folders(user_id):
+    return select(Folder).where(Folder.user_id == user_id).order_by(Folder.created_at.desc())
+
+
+def root_files(user_id):
+    # Files that do not belong to any folder
+    return select(File).where(File.user_id == user_id, File.folder_id.is_(None)).order_by(File.created_at.desc())
+
+
+def folder_files(folder_id, user_id):
+    return select(File).where(File.folder_id == folder_id, File.user_id == user_id)
+
+
+def monthly_usage(user_id, year):
+    # Size of the files uploaded in each month of the year
+    month = extract("month", File.created_at)
+    return (
+        select(month.label("month"), func.sum(File.size).label("total_size"))
+        .where(File.user_id == user_id, extract("year", File.created_at) == year)
+        .group_by(month)
+    )
+
+
+async def get_folder_files(session: AsyncSession, folder_id) -> List[Tuple[int, str]]:
+    """
+    Returns the id and name of every file stored in the folder or any of its
+    subfolders.
+    """
+    result = await session.execute(folder_tree_files(folder_id))
+    return [(row.file_id, row.file_name) for row in result]
+
+
+def archive_name(name: str, taken: set) -> str:
+    # Folder and file names are free text, keep each one a single, unique path component
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    if name in ("", ".", ".."):
+        name = "_"
+    stem, dot, extension = name.rpartition(".")
+    if not stem:
+        stem, dot, extension = name, "", ""
+    candidate, copy = name, 1
+    while candidate.lower() in taken:
+        candidate = f"{stem} ({copy}){dot}{extension}"
+        copy += 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+async def get_folder_archive_entries(session: AsyncSession, folder: Folder) -> List[ArchiveEntry]:
+    """
+    Lists the folder, its subfolders and their rebuilt files as archive
+    entries, directories before their content.
+    """
+    tree = (
+        select(Folder.id, Folder.parent_id, Folder.name, Folder.edited_at)
+        .where(Folder.id == folder.id)
+        .cte(name="folder_tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(Folder.id, Folder.parent_id, Folder.name, Folder.edited_at).where(Folder.parent_id == tree.c.id)
+    )
+    folders = (await session.execute(select(tree))).all()
+    files = await session.execute(
+        select(File.folder_id, File.file_id, File.file_name, File.file_type, File.edited_at)
+        .where(
+            File.folder_id.in_(select(tree.c.id)),
+            File.user_id == folder.user_id,
+            File.is_ready.is_(True),
+        )
+        .order_by(File.file_name)
+    )
+    files_by_folder: Dict = {}
+    for file in files:
+        files_by_folder.setdefault(file.folder_id, []).append(file)
+    children: Dict = {}
+    for row in folders:
+        children.setdefault(row.parent_id, []).append(row)
+
+    entries = []
+    pending = [(folder, "", set())]
+    while pending:
+        row, parent_path, siblings = pending.pop()
+        path = f"{parent_path}{archive_name(row.name, siblings)}/"
+        entries.append(ArchiveEntry(name=path, modified=row.edited_at))
+        taken = set()
+        for child in sorted(children.get(row.id, []), key=lambda child: child.name, reverse=True):
+            pending.append((child, path, taken))
+        for file in files_by_folder.get(row.id, []):
+            entries.append(ArchiveEntry(
+                name=path + archive_name(file.file_name, taken),
+                path=str(assembled_file_path(file.file_id, file.file_name)),
+                modified=file.edited_at,
+                compress=not is_compressed_type(file.file_type or file.file_name),
+            ))
+    return entries
+
  
 @user_router.get("/google_redirect")
 async def login():
@@ -39,8 +151,7 @@ async def get_user_information(request: Request):
     if current_user:
         async with get_async_session() as session:
             # Use the select construct for the query
-            stmt = select(User).where(User.id == current_user.id)
-            result = await session.execute(stmt)
+            result = await session.execute(user_by_id(current_user.id))
             user_info = result.scalar_one_or_none()
             return user_info
     else:
@@ -64,17 +175,7 @@ async def get_yearly_usage(request: Request):
     current_user = request.user
     if current_user:
         async with get_async_session() as db:
-            yearly_usage = await db.execute(
-                select(
-                    extract("month", File.created_at).label("month"),
-                    func.sum(File.size).label("total_size")
-                )
-                .where(
-                    File.user_id == current_user.id,
-                    extract("year", File.created_at) == datetime.datetime.now().year
-                )
-                .group_by(extract("month", File.created_at))
-            )
+            yearly_usage = await db.execute(monthly_usage(current_user.id, datetime.datetime.now().year))
 
             result = yearly_usage.all()
 
@@ -98,19 +199,11 @@ async def get_user_folders_and_files(
     try:
         async with session.begin():
             # Fetch folders and order by Folder.created_at
-            folders_result = await session.execute(
-                select(Folder)
-                .where(Folder.user_id == current_user.id)
-                .order_by(Folder.created_at.desc())  # Corrected to Folder.created_at
-            )
+            folders_result = await session.execute(user_folders(current_user.id))
             folders = folders_result.scalars().all()
 
             # Fetch files that do not belong to any folder
-            files_result = await session.execute(
-                select(File)
-                .where(File.user_id == current_user.id, File.folder_id.is_(None))
-                .order_by(File.created_at.desc())
-            )
+            files_result = await session.execute(root_files(current_user.id))
             files = files_result.scalars().all()
 
             # Transform folders to JSON serializable format
@@ -193,19 +286,25 @@ async def delete_folder(
         raise UnauthorizedException()
     async with session.begin():
         # Check if the folder exists and belongs to the current user
-        query = select(Folder).where(Folder.id == folder_id, Folder.user_id == current_user.id)
-        result = await session.execute(query)
+        result = await session.execute(user_folder(folder_id, current_user.id))
         folder = result.scalars().first()
         
         if not folder:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found or access denied")
-        
+
+        files = await get_folder_files(session, folder.id)
+        released = await release_file_chunks(session, [file_id for file_id, _ in files])
+
         # Delete the folder record from the database
         await session.delete(folder)
         
         # Commit the transaction
         await session.commit()
 
+    await remove_assembled_files(files)
+    # Chunk payloads no other file references are removed from the chunk store
+    await collect_chunk_blobs(released)
+
     return {"message": "Folder deleted successfully"}
 
 
@@ -229,8 +328,7 @@ async def get_files_in_folder(request: Request, folder_id: str, session: AsyncSe
         #         .where(File.user_id == current_user.id, File.folder_id.is_(None))
         #         .order_by(File.created_at.desc())
         # )
-        stmt = select(File).where(File.folder_id == folder_id, File.user_id == current_user.id,)
-        result = await session.execute(stmt)
+        result = await session.execute(folder_files(folder_id, current_user.id))
         files = result.scalars().all()
 
         # Manually construct response data
@@ -244,4 +342,30 @@ async def get_files_in_folder(request: Request, folder_id: str, session: AsyncSe
             for file in files
         ]
 
-        return files_info
\ No newline at end of file
+        return files_info
+
+
+@user_router.get("/folders/{folder_id}/archive")
+async def download_folder_archive(request: Request, folder_id: str):
+    """
+    Streams the folder and its subfolders as a ZIP archive built on the fly.
+    Already compressed files are stored as they are, others are deflated.
+    Files that are not rebuilt yet are left out.
+    """
+    current_user = request.user
+    if not current_user:
+        raise UnauthorizedException()
+
+    async with get_async_session() as session:
+        result = await session.execute(user_folder(folder_id, current_user.id))
+        folder = result.scalar_one_or_none()
+        if folder is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found or access denied")
+        entries = await get_folder_archive_entries(session, folder)
+
+    return StreamingResponse(
+        iter_zip_archive(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(folder.name)}.zip"},
+    )
+
@@ -1,4 +1,6 @@
 from celery import Celery
+
+from app.core.config import config
  
 
 # Initialize your Celery app here with the broker URL
@@ -8,6 +10,12 @@ celery_app.autodiscover_tasks(['app.api.file_uploads'])
 
 celery_app.conf.update({
     'worker_pool': 'gevent',  
+    'beat_schedule': {
+        'sweep-abandoned-uploads': {
+            'task': 'app.api.file_uploads.tasks.sweep_abandoned_uploads',
+            'schedule': float(config.SWEEP_INTERVAL),
+        },
+    },
 })
  
 
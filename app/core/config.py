@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -7,6 +8,7 @@ load_dotenv()
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_file_path = os.path.join(current_dir, os.getenv("DB_FILE_PATH"))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
 
 class Config(BaseSettings):
     ENV: str = "development"
@@ -15,6 +17,19 @@ class Config(BaseSettings):
     APP_PORT: int = os.getenv("APP_PORT")
     WRITER_DB_URL: str = os.getenv("WRITER_DB_URL")
     READER_DB_URL: str = os.getenv("READER_DB_URL")
+    # Connection pool of each engine, every API and worker process has its own
+    DB_POOL_SIZE: int = os.getenv("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW: int = os.getenv("DB_MAX_OVERFLOW", 10)
+    DB_POOL_TIMEOUT: float = os.getenv("DB_POOL_TIMEOUT", 30)
+    DB_POOL_RECYCLE: int = os.getenv("DB_POOL_RECYCLE", 3600)
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", False)
+    # asyncpg statement cache size per connection, 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = os.getenv("DB_STATEMENT_CACHE_SIZE")
+    # Reads of a client that wrote in the last READ_YOUR_WRITES_WINDOW seconds go to the writer
+    READ_YOUR_WRITES_WINDOW: float = os.getenv("READ_YOUR_WRITES_WINDOW", 5)
+    # Reads go to the writer while the reader replica is more than REPLICA_MAX_LAG seconds behind
+    REPLICA_MAX_LAG: float = os.getenv("REPLICA_MAX_LAG", 2)
+    REPLICA_LAG_PROBE_INTERVAL: float = os.getenv("REPLICA_LAG_PROBE_INTERVAL", 1)
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM")
     SENTRY_SDN: str = os.getenv("SENTRY_SDN")
@@ -35,7 +50,53 @@ class Config(BaseSettings):
     REDIRECT_URI : str = os.getenv("REDIRECT_URI")
     CLIENT_SECRET: str = os.getenv("CLIENT_SECRET")
     CLIENT_ID : str = os.getenv("CLIENT_ID")
-    
+    UPLOADS_DIR: str = os.getenv("UPLOADS_DIR", os.path.join(root_dir, "Uploads"))
+    CHUNK_STORE_BACKEND: str = os.getenv("CHUNK_STORE_BACKEND", "disk")
+    CHUNK_STORE_BLOCK_SIZE: int = os.getenv("CHUNK_STORE_BLOCK_SIZE", 1024 * 1024)
+    # "zstd" compresses chunks of compressible file types when the zstandard package is installed
+    CHUNK_COMPRESSION: str = os.getenv("CHUNK_COMPRESSION", "zstd")
+    CHUNK_COMPRESSION_LEVEL: int = os.getenv("CHUNK_COMPRESSION_LEVEL", 3)
+    CHUNK_COMPRESSION_TRIAL_SIZE: int = os.getenv("CHUNK_COMPRESSION_TRIAL_SIZE", 64 * 1024)
+    CHUNK_COMPRESSION_MIN_RATIO: float = os.getenv("CHUNK_COMPRESSION_MIN_RATIO", 1.2)
+    UPLOAD_MAX_CHUNK_SIZE: int = os.getenv("UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024)
+    # Upload sessions split files in chunks of at least this size, and in at most UPLOAD_MAX_CHUNKS chunks
+    UPLOAD_MIN_CHUNK_SIZE: int = os.getenv("UPLOAD_MIN_CHUNK_SIZE", 256 * 1024)
+    UPLOAD_MAX_CHUNKS: int = os.getenv("UPLOAD_MAX_CHUNKS", 65536)
+    UPLOAD_BATCH_MAX_CHUNKS: int = os.getenv("UPLOAD_BATCH_MAX_CHUNKS", 256)
+    # Instant uploads prove they hold the content by hashing this many random ranges of it
+    INSTANT_UPLOAD_PROOF_RANGES: int = os.getenv("INSTANT_UPLOAD_PROOF_RANGES", 4)
+    INSTANT_UPLOAD_PROOF_RANGE_SIZE: int = os.getenv("INSTANT_UPLOAD_PROOF_RANGE_SIZE", 64 * 1024)
+    INSTANT_UPLOAD_PROOF_TTL: int = os.getenv("INSTANT_UPLOAD_PROOF_TTL", 5 * 60)
+    # Chunks a WebSocket upload client may have in flight before waiting for acks
+    WS_UPLOAD_WINDOW: int = os.getenv("WS_UPLOAD_WINDOW", 8)
+    # Upload admission control, per API process
+    ADMISSION_MAX_REQUESTS: int = os.getenv("ADMISSION_MAX_REQUESTS", 64)
+    ADMISSION_MAX_BYTES: int = os.getenv("ADMISSION_MAX_BYTES", 512 * 1024 * 1024)
+    ADMISSION_USER_MAX_REQUESTS: int = os.getenv("ADMISSION_USER_MAX_REQUESTS", 8)
+    ADMISSION_USER_MAX_BYTES: int = os.getenv("ADMISSION_USER_MAX_BYTES", 128 * 1024 * 1024)
+    ADMISSION_MAX_QUEUE: int = os.getenv("ADMISSION_MAX_QUEUE", 128)
+    ADMISSION_QUEUE_TIMEOUT: float = os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0)
+    ADMISSION_RETRY_AFTER: int = os.getenv("ADMISSION_RETRY_AFTER", 2)
+    # Bearer token scrapers send to /metrics, which is closed while it is empty
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # Storage totals of /metrics aggregate every chunk blob, they are recomputed at most this often
+    METRICS_STORAGE_TTL: float = os.getenv("METRICS_STORAGE_TTL", 60)
+    # copy_file_range, sendfile or buffered, see app/api/file_uploads/tasks.py
+    ASSEMBLY_STRATEGY: str = os.getenv("ASSEMBLY_STRATEGY", "copy_file_range")
+    # Incomplete uploads idle for this many seconds are deleted by the sweeper, every SWEEP_INTERVAL seconds
+    ABANDONED_UPLOAD_MAX_AGE: int = os.getenv("ABANDONED_UPLOAD_MAX_AGE", 7 * 24 * 60 * 60)
+    SWEEP_INTERVAL: int = os.getenv("SWEEP_INTERVAL", 60 * 60)
+    SWEEP_BATCH_SIZE: int = os.getenv("SWEEP_BATCH_SIZE", 1000)
+    # Files at least this large are rebuilt by REBUILD_SEGMENTS tasks in parallel
+    PARALLEL_REBUILD_MIN_SIZE: int = os.getenv("PARALLEL_REBUILD_MIN_SIZE", 1024 * 1024 * 1024)
+    REBUILD_SEGMENTS: int = os.getenv("REBUILD_SEGMENTS", 8)
+    # Drop chunk rows and payloads once the rebuilt file is verified against them
+    RELEASE_REBUILT_CHUNKS: bool = os.getenv("RELEASE_REBUILT_CHUNKS", True)
+    # Signed download links, signed with JWT_SECRET_KEY unless a key of their own is set
+    DOWNLOAD_URL_SECRET: str = os.getenv("DOWNLOAD_URL_SECRET", "")
+    DOWNLOAD_URL_TTL: int = os.getenv("DOWNLOAD_URL_TTL", 60 * 60)
+    DOWNLOAD_URL_MAX_TTL: int = os.getenv("DOWNLOAD_URL_MAX_TTL", 7 * 24 * 60 * 60)
+
 
 class DevelopmentConfig(Config):
     WRITER_DB_URL: str = os.getenv("WRITER_DB_URL")
@@ -1,4 +1,5 @@
-from .session import Base, get_sync_session, get_async_session, session
+from .session import Base, get_sync_session, get_async_session, session, engines, sync_engines
+from .pool import pool_status
 # from .standalone_session import standalone_session
 from .transactional import AsyncTransactional 
 
@@ -8,5 +9,8 @@ __all__ = [
     "AsyncTransactional",
     "session",
     "get_async_session",
+    "engines",
+    "sync_engines",
+    "pool_status",
     # "SyncTransactional"
 ]
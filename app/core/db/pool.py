@@ -0,0 +1,55 @@
+import time
+from collections import Counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class TimedPoolMixin:
+    """
+    Records how long checkouts wait for a connection, and how many give up
+    after `pool_timeout`. Waits grow long before the pool times out, so
+    they show starvation while there is still time to resize it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = Counter()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_stats["checkouts"] += 1
+            self.wait_stats["wait_seconds"] += waited
+            self.wait_stats["max_wait_seconds"] = max(self.wait_stats["max_wait_seconds"], waited)
+
+
+class TimedAsyncPool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedPool(TimedPoolMixin, QueuePool):
+    pass
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    stats = getattr(pool, "wait_stats", Counter())
+    checkouts = stats["checkouts"]
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # QueuePool counts down from -pool_size until the pool is full
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": checkouts,
+        "timeouts": stats["timeouts"],
+        "avg_wait_ms": round(stats["wait_seconds"] / checkouts * 1000, 3) if checkouts else 0.0,
+        "max_wait_ms": round(float(stats["max_wait_seconds"]) * 1000, 3),
+    }
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+# Per request: whether its reads go to the writer, and whether it wrote
+read_state: ContextVar[Optional[dict]] = ContextVar("read_state", default=None)
+
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        -- An idle primary sends nothing to replay, the replica is not behind
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaLag:
+    """
+    Measures how far the reader replica is behind the writer, every
+    REPLICA_LAG_PROBE_INTERVAL seconds. Reads stay on the writer while the
+    lag is above REPLICA_MAX_LAG, while the probe fails, and before its
+    first result.
+    """
+
+    def __init__(self) -> None:
+        self.lag: Optional[float] = None
+        self.probed_at: Optional[float] = None
+        self.reads = Counter()
+        self.same_database = False
+        self.task: Optional[asyncio.Task] = None
+
+    def healthy(self) -> bool:
+        if self.same_database:
+            return True
+        if self.lag is None or self.probed_at is None:
+            return False
+        stale_after = 3 * float(config.REPLICA_LAG_PROBE_INTERVAL)
+        return self.lag <= float(config.REPLICA_MAX_LAG) and time.monotonic() - self.probed_at <= stale_after
+
+    async def measure(self, engine) -> float:
+        async with engine.connect() as connection:
+            result = await connection.execute(REPLICA_LAG_QUERY)
+            return float(result.scalar_one())
+
+    async def probe(self, engine) -> None:
+        interval = float(config.REPLICA_LAG_PROBE_INTERVAL)
+        while True:
+            try:
+                self.lag = await asyncio.wait_for(self.measure(engine), interval)
+                self.probed_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Replica lag probe failed, reads go to the writer", exc_info=True)
+                self.lag = None
+            await asyncio.sleep(interval)
+
+    def start(self, engine, same_database: bool = False) -> None:
+        # When the reader is the writer there is no lag to wait for
+        self.same_database = same_database
+        if not same_database:
+            self.task = asyncio.create_task(self.probe(engine))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "lag_seconds": self.lag,
+            "healthy": self.healthy(),
+            "reads": dict(self.reads),
+        }
+
+
+replica_lag = ReplicaLag()
+
+# User id -> until when their reads stay on the writer, for clients that do not keep cookies
+pinned_users: Dict[str, float] = {}
+
+
+def pin_user(user_id: str, until: float) -> None:
+    if len(pinned_users) > 10000:
+        now = time.time()
+        for stale in [key for key, expiry in pinned_users.items() if expiry < now]:
+            del pinned_users[stale]
+    pinned_users[user_id] = until
+
+
+def user_pinned(user_id: Optional[str]) -> bool:
+    return user_id is not None and pinned_users.get(user_id, 0) > time.time()
+
+
+def record_write() -> None:
+    state = read_state.get()
+    if state is not None:
+        # Later reads of the request, and of the client for a while, see this write
+        state["wrote"] = True
+        state["pinned"] = True
+
+
+def reads_use_writer() -> bool:
+    state = read_state.get()
+    if state is not None and state["pinned"]:
+        replica_lag.reads["writer_pinned"] += 1
+        return True
+    if not replica_lag.healthy():
+        replica_lag.reads["writer_lagging"] += 1
+        return True
+    replica_lag.reads["reader"] += 1
+    return False
@@ -1,6 +1,7 @@
 from contextvars import ContextVar, Token
 from sqlalchemy import create_engine
-from typing import Union
+from sqlalchemy.engine import make_url
+from typing import Optional, Union
 
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -13,10 +14,14 @@ from sqlalchemy.sql.expression import Update, Delete, Insert
 
 from app.core.config import config
 
+from .pool import TimedAsyncPool, TimedPool
+from .routing import record_write, reads_use_writer
+
 session_context: ContextVar[str] = ContextVar("session_context")
 
 
 def get_session_context() -> str:
+    # LookupError outside of a request
     return session_context.get()
 
 
@@ -28,15 +33,39 @@ def reset_session_context(context: Token) -> None:
     session_context.reset(context)
 
 
+def pool_options() -> dict:
+    return {
+        "pool_size": int(config.DB_POOL_SIZE),
+        "max_overflow": int(config.DB_MAX_OVERFLOW),
+        "pool_timeout": float(config.DB_POOL_TIMEOUT),
+        "pool_recycle": int(config.DB_POOL_RECYCLE),
+        "pool_pre_ping": bool(config.DB_POOL_PRE_PING),
+    }
+
+
+def make_async_engine(url: str):
+    url = make_url(url)
+    connect_args = {}
+    if config.DB_STATEMENT_CACHE_SIZE is not None:
+        # 0 disables both statement caches, as transaction pooling (pgbouncer) requires
+        cache_size = int(config.DB_STATEMENT_CACHE_SIZE)
+        connect_args["statement_cache_size"] = cache_size
+        url = url.update_query_dict({"prepared_statement_cache_size": str(cache_size)})
+    return create_async_engine(url, poolclass=TimedAsyncPool, connect_args=connect_args, **pool_options())
+
+
 engines = {
-    "writer": create_async_engine(config.WRITER_DB_URL, pool_recycle=3600),
-    "reader": create_async_engine(config.READER_DB_URL, pool_recycle=3600),
+    "writer": make_async_engine(config.WRITER_DB_URL),
+    "reader": make_async_engine(config.READER_DB_URL),
 }
 
 
 class RoutingSession(Session):
     def get_bind(self, mapper=None, clause=None, **kw):
         if self._flushing or isinstance(clause, (Update, Delete, Insert)):
+            record_write()
+            return engines["writer"].sync_engine
+        elif reads_use_writer():
             return engines["writer"].sync_engine
         else:
             return engines["reader"].sync_engine
@@ -52,12 +81,61 @@ session: Union[AsyncSession, async_scoped_session] = async_scoped_session(
     scopefunc=get_session_context,
 )
 
-def get_async_session() -> Session:
-    return async_session_factory()
+class SessionHandle:
+    """
+    What `get_async_session()` returns. Inside an HTTP request it stands for
+    the request's scoped session, created on first use, so the handler,
+    `AsyncTransactional` and the authentication lookup share one session
+    and at most one pooled connection. Outside a request (WebSockets,
+    startup, background work) it stands for a session of its own.
+
+    Used as `async with get_async_session() as session:`, the outermost
+    block closes the session when it ends, which gives its connection back
+    to the pool; a later block of the same request starts on a fresh
+    connection. A nested block, such as a service helper called from the
+    handler, gets the same session and leaves it open; it commits nothing
+    unless the code inside commits, and that commits the request's changes
+    too. Used as a FastAPI dependency, it forwards to the session.
+    """
+
+    def __init__(self) -> None:
+        self.current: Optional[AsyncSession] = None
+
+    def target(self) -> AsyncSession:
+        if self.current is None:
+            try:
+                get_session_context()
+                self.current = session()
+            except LookupError:
+                self.current = async_session_factory()
+        return self.current
+
+    async def __aenter__(self) -> AsyncSession:
+        target = self.target()
+        target.info["depth"] = target.info.get("depth", 0) + 1
+        return target
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.current.info["depth"] -= 1
+        if not self.current.info["depth"]:
+            await self.current.close()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+
+def get_async_session() -> SessionHandle:
+    return SessionHandle()
+
+def get_sync_url(url: str):
+    # The configured URLs name an async driver, sync engines use the dialect's default one
+    url = make_url(url)
+    return url.set(drivername=url.get_backend_name())
+
 
 sync_engines = {
-    "writer": create_engine(config.WRITER_DB_URL),
-    "reader": create_engine(config.READER_DB_URL),
+    "writer": create_engine(get_sync_url(config.WRITER_DB_URL), poolclass=TimedPool, **pool_options()),
+    "reader": create_engine(get_sync_url(config.READER_DB_URL), poolclass=TimedPool, **pool_options()),
 }
 
 SyncSessionLocal = sessionmaker(
@@ -12,9 +12,12 @@ class AsyncTransactional:
         async def _transactional(*args, **kwargs):
             try:
                 result = await func(*args, **kwargs)
-                await session.commit()
+                # A request that never used its session has nothing to commit
+                if session.registry.has():
+                    await session.commit()
             except Exception as e:
-                await session.rollback()
+                if session.registry.has():
+                    await session.rollback()
                 raise e
 
             return result
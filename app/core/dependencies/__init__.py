@@ -1,8 +1,10 @@
 from .logging import Logging
+from .admission import AdmissionController, AdmissionRoute, upload_admission
 from .permission import (
     PermissionDependency,
     IsAuthenticated,
     IsAdmin,
+    HasMetricsToken,
     AllowAll,
 )
 
@@ -11,5 +13,9 @@ __all__ = [
     "PermissionDependency",
     "IsAuthenticated",
     "IsAdmin",
+    "HasMetricsToken",
     "AllowAll",
+    "AdmissionController",
+    "AdmissionRoute",
+    "upload_admission",
 ]
@@ -0,0 +1,206 @@
+import asyncio
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Hashable, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import config
+from app.core.exceptions import TooManyRequestsException
+
+
+class AdmissionController:
+    """
+    Bounds the requests and request bytes in flight, globally and per user.
+    A request that does not fit waits in its user's queue for at most
+    `queue_timeout` seconds; users are served round robin so one user's
+    backlog cannot starve the others. Requests that would queue beyond
+    `max_queue`, or past the timeout, fail fast with 429 and Retry-After.
+
+    The limits are per process, every uvicorn worker has its own controller.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        max_bytes: int,
+        user_max_requests: int,
+        user_max_bytes: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int,
+    ):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.user_max_requests = user_max_requests
+        self.user_max_bytes = user_max_bytes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.requests = 0
+        self.bytes = 0
+        self.user_requests: Counter = Counter()
+        self.user_bytes: Counter = Counter()
+        self.queues: "OrderedDict[Hashable, Deque[Tuple[int, asyncio.Future]]]" = OrderedDict()
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+
+    def fits(self, key: Hashable, size: int) -> bool:
+        return (
+            self.requests < self.max_requests
+            and self.bytes + size <= self.max_bytes
+            and self.user_requests[key] < self.user_max_requests
+            and self.user_bytes[key] + size <= self.user_max_bytes
+        )
+
+    def grant(self, key: Hashable, size: int) -> None:
+        self.requests += 1
+        self.bytes += size
+        self.user_requests[key] += 1
+        self.user_bytes[key] += size
+        self.admitted += 1
+
+    def release(self, key: Hashable, size: int) -> None:
+        self.requests -= 1
+        self.bytes -= size
+        self.user_requests[key] -= 1
+        self.user_bytes[key] -= size
+        if not self.user_requests[key]:
+            del self.user_requests[key]
+            del self.user_bytes[key]
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        # Each pass grants at most one request per user, granted users move to the back
+        progress = True
+        while progress and self.queues:
+            progress = False
+            for key in list(self.queues):
+                queue = self.queues[key]
+                size, waiter = queue[0]
+                if not self.fits(key, size):
+                    continue
+                queue.popleft()
+                self.queued -= 1
+                if queue:
+                    self.queues.move_to_end(key)
+                else:
+                    del self.queues[key]
+                self.grant(key, size)
+                waiter.set_result(None)
+                progress = True
+
+    def reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise TooManyRequestsException(
+            message="The server is busy with other uploads, retry later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def abandon(self, key: Hashable, entry: Tuple[int, asyncio.Future]) -> None:
+        size, waiter = entry
+        if waiter.done():
+            # Granted while the caller was giving up
+            self.release(key, size)
+            return
+        queue = self.queues[key]
+        queue.remove(entry)
+        self.queued -= 1
+        if not queue:
+            del self.queues[key]
+
+    async def acquire(self, key: Hashable, size: int) -> None:
+        if not self.queued and self.fits(key, size):
+            self.grant(key, size)
+            return
+        if self.queued >= self.max_queue:
+            self.reject("queue_full")
+        queue = self.queues.setdefault(key, deque())
+        if len(queue) >= self.user_max_requests:
+            self.reject("user_queue_full")
+
+        entry = (size, asyncio.get_running_loop().create_future())
+        queue.append(entry)
+        self.queued += 1
+        self.dispatch()
+        try:
+            await asyncio.wait((entry[1],), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self.abandon(key, entry)
+            raise
+        if not entry[1].done():
+            self.abandon(key, entry)
+            self.reject("timeout")
+
+    @asynccontextmanager
+    async def admit(self, key: Hashable, size: int):
+        # A single request larger than a limit is still served, alone
+        size = min(size, self.max_bytes, self.user_max_bytes)
+        await self.acquire(key, size)
+        try:
+            yield
+        finally:
+            self.release(key, size)
+
+    def snapshot(self) -> Dict:
+        return {
+            "in_flight_requests": self.requests,
+            "in_flight_bytes": self.bytes,
+            "queue_depth": self.queued,
+            "queued_users": len(self.queues),
+            "admitted_total": self.admitted,
+            "rejected_total": sum(self.rejected.values()),
+            "rejected": dict(self.rejected),
+            "limits": {
+                "max_requests": self.max_requests,
+                "max_bytes": self.max_bytes,
+                "user_max_requests": self.user_max_requests,
+                "user_max_bytes": self.user_max_bytes,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+            },
+        }
+
+
+upload_admission = AdmissionController(
+    max_requests=int(config.ADMISSION_MAX_REQUESTS),
+    max_bytes=int(config.ADMISSION_MAX_BYTES),
+    user_max_requests=int(config.ADMISSION_USER_MAX_REQUESTS),
+    user_max_bytes=int(config.ADMISSION_USER_MAX_BYTES),
+    max_queue=int(config.ADMISSION_MAX_QUEUE),
+    queue_timeout=float(config.ADMISSION_QUEUE_TIMEOUT),
+    retry_after=int(config.ADMISSION_RETRY_AFTER),
+)
+
+
+def request_size(request: Request) -> int:
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        # Chunked bodies are assumed to be a full chunk
+        return int(config.UPLOAD_MAX_CHUNK_SIZE)
+
+
+class AdmissionRoute(APIRoute):
+    """
+    Route class admitting requests that carry a body through
+    `upload_admission`. It runs before FastAPI reads the body, so a rejected
+    upload is never parsed or spooled.
+    """
+
+    admitted_methods = {"POST", "PUT", "PATCH"}
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def admitted_handler(request: Request) -> Response:
+            if request.method not in self.admitted_methods:
+                return await handler(request)
+            key = getattr(request.user, "id", None) or request.client.host
+            async with upload_admission.admit(key, request_size(request)):
+                return await handler(request)
+
+        return admitted_handler
@@ -1,3 +1,4 @@
+import hmac
 from abc import ABC, abstractmethod
 from typing import List, Type
 
@@ -5,6 +6,7 @@ from fastapi import Request
 from fastapi.openapi.models import APIKey, APIKeyIn
 from fastapi.security.base import SecurityBase
 
+from app.core.config import config
 from app.core.exceptions import CustomException, UnauthorizedException
 
 """
@@ -36,6 +38,17 @@ class IsAdmin(BasePermission):
         return await UserService().is_admin(user_id=user_id)
 
 
+class HasMetricsToken(BasePermission):
+    exception = UnauthorizedException
+
+    async def has_permission(self, request: Request) -> bool:
+        # Closed until a token is configured
+        if not config.METRICS_TOKEN:
+            return False
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(credentials.encode(), config.METRICS_TOKEN.encode())
+
+
 class AllowAll(BasePermission):
     async def has_permission(self, request: Request) -> bool:
         return True
@@ -1,20 +1,29 @@
 from .base import (
     CustomException,
     BadRequestException,
+    ChecksumMismatchException,
     NotFoundException,
     ForbiddenException,
+    GoneException,
     UnprocessableEntity,
     DuplicateValueException,
     UnauthorizedException,
     MethodNotAllowedException,
+    TooManyRequestsException,
+    ServiceUnavailableException,
+    ChunkPayloadGoneException,
+    RequestEntityTooLargeException,
+    StorageQuotaExceededException,
 )
 from .token import DecodeTokenException, ExpiredTokenException
 
 __all__ = [
     "CustomException",
     "BadRequestException",
+    "ChecksumMismatchException",
     "NotFoundException",
     "ForbiddenException",
+    "GoneException",
     "UnprocessableEntity",
     "DuplicateValueException",
     "UnauthorizedException",
@@ -22,5 +31,10 @@ __all__ = [
     "DecodeTokenException",
     "ExpiredTokenException", 
     "MethodNotAllowedException",
-    "DecodeTokenException"
+    "DecodeTokenException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ChunkPayloadGoneException",
+    "RequestEntityTooLargeException",
+    "StorageQuotaExceededException",
 ]
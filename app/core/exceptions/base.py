@@ -5,18 +5,24 @@ class CustomException(Exception):
     code = HTTPStatus.BAD_REQUEST
     success = False
     message = HTTPStatus.BAD_REQUEST.description
+    headers = None
 
-    def __init__(self, code=0, message=None):
+    def __init__(self, code=0, message=None, headers=None):
         if code:
             self.code = code
         if message:
             self.message = message
+        if headers:
+            self.headers = headers
 
 class BadRequestException(CustomException):
     code = HTTPStatus.BAD_REQUEST
     success = False
     message = HTTPStatus.BAD_REQUEST.description
 
+class ChecksumMismatchException(BadRequestException):
+    message = "Chunk checksum mismatch"
+
 class UnauthorizedException(CustomException):
     code = HTTPStatus.UNAUTHORIZED
     success = False
@@ -82,6 +88,14 @@ class UnsupportedMediaTypeException(CustomException):
     success = False
     message = HTTPStatus.UNSUPPORTED_MEDIA_TYPE.description
 
+class RequestEntityTooLargeException(CustomException):
+    code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    success = False
+    message = HTTPStatus.REQUEST_ENTITY_TOO_LARGE.description
+
+class StorageQuotaExceededException(RequestEntityTooLargeException):
+    message = "Not enough storage space left"
+
 class RangeNotSatisfiableException(CustomException):
     code = HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
     success = False
@@ -116,3 +130,12 @@ class DuplicateValueException(CustomException):
     code = HTTPStatus.UNPROCESSABLE_ENTITY
     success = False
     message = HTTPStatus.UNPROCESSABLE_ENTITY.description
+
+class ServiceUnavailableException(CustomException):
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    success = False
+    message = HTTPStatus.SERVICE_UNAVAILABLE.description
+
+class ChunkPayloadGoneException(ServiceUnavailableException):
+    message = "Chunk content was removed while being stored, send the chunk again"
+    headers = {"Retry-After": "1"}
@@ -1,4 +1,5 @@
 from .authentication import AuthenticationMiddleware, AuthBackend
+from .read_your_writes import ReadYourWritesMiddleware
 from .response_log import ResponseLogMiddleware
 from .sqlalchemy import SQLAlchemyMiddleware
 
@@ -6,5 +7,6 @@ __all__ = [
     "AuthenticationMiddleware",
     "AuthBackend",
     "SQLAlchemyMiddleware",
+    "ReadYourWritesMiddleware",
     "ResponseLogMiddleware",
 ]
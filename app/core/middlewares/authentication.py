@@ -12,6 +12,10 @@ from app.core.db import get_async_session
 from sqlalchemy import select
 from uuid import UUID
 
+def user_by_id(user_id: UUID):
+    return select(User).where(User.id == user_id)
+
+
 # @standalone_session
 async def get_user_by_id(user_id: str) -> User:
     try:
@@ -20,8 +24,7 @@ async def get_user_by_id(user_id: str) -> User:
         print("Invalid UUID format")
         return None
     async with get_async_session() as session:
-        query = select(User).where(User.id == valid_uuid)
-        result = await session.execute(query)
+        result = await session.execute(user_by_id(valid_uuid))
         user = result.scalar_one_or_none()
     return user
 
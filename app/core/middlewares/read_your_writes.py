@@ -0,0 +1,59 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+from app.core.db.routing import read_state, pin_user, user_pinned
+
+PIN_COOKIE = "xendpal_rw_until"
+
+
+class ReadYourWritesMiddleware:
+    """
+    Keeps a client's reads on the writer for READ_YOUR_WRITES_WINDOW seconds
+    after a request of theirs wrote, so they never read from a replica that
+    has not caught up with their own change. The window travels in a cookie,
+    which every API process honours, and is also kept per user in this
+    process for clients that do not store cookies. Runs after authentication
+    so the user is known.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        connection = HTTPConnection(scope)
+        user_id = getattr(scope.get("user"), "id", None)
+        user_id = str(user_id) if user_id is not None else None
+        try:
+            pinned_until = float(connection.cookies.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        state = {"pinned": pinned_until > time.time() or user_pinned(user_id), "wrote": False}
+        context = read_state.set(state)
+
+        async def pinning_send(message: Message) -> None:
+            if message["type"] == "http.response.start" and state["wrote"]:
+                window = float(config.READ_YOUR_WRITES_WINDOW)
+                until = time.time() + window
+                if user_id is not None:
+                    pin_user(user_id, until)
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{PIN_COOKIE}={until:.3f}; Max-Age={int(window) + 1}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, pinning_send)
+        finally:
+            if state["wrote"] and user_id is not None:
+                # Writes that finish after the response started, background tasks included
+                pin_user(user_id, time.time() + float(config.READ_YOUR_WRITES_WINDOW))
+            read_state.reset(context)
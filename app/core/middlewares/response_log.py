@@ -14,6 +14,19 @@ class ResponseInfo(BaseModel):
         arbitrary_types_allowed = True
 
 
+# Only the start of a body is kept, responses may be whole files
+MAX_LOGGED_BODY = 4096
+
+
+def should_capture_body(headers: Headers) -> bool:
+    # File responses, whose messages may be zerocopysend ones, go through untouched, and so do
+    # downloads of any kind such as signed links
+    if headers.get("accept-ranges") == "bytes" or "content-disposition" in headers:
+        return False
+    # So do streamed responses of unknown length, such as folder archives
+    return "content-length" in headers
+
+
 class ResponseLogMiddleware:
     def __init__(self, app: ASGIApp) -> None:
         self.app = app
@@ -23,14 +36,18 @@ class ResponseLogMiddleware:
             return await self.app(scope, receive, send)
 
         response_info = ResponseInfo()
+        capture_body = True
 
         async def _logging_send(message: Message) -> None:
+            nonlocal capture_body
             if message.get("type") == "http.response.start":
                 response_info.headers = Headers(raw=message.get("headers"))
                 response_info.status_code = message.get("status")
-            elif message.get("type") == "http.response.body":
-                if body := message.get("body"):
-                    response_info.body += body
+                capture_body = should_capture_body(response_info.headers)
+            elif message.get("type") == "http.response.body" and capture_body:
+                room = MAX_LOGGED_BODY - len(response_info.body)
+                if room > 0 and (body := message.get("body")):
+                    response_info.body += body[:room]
 
             await send(message)
 
@@ -10,6 +10,10 @@ class SQLAlchemyMiddleware:
         self.app = app
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # WebSockets live too long to keep one session, their handlers open their own
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
         session_id = str(uuid4())
         context = set_session_context(session_id=session_id)
 
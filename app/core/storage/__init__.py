@@ -0,0 +1,46 @@
+from app.core.config import config
+
+from .archive import ArchiveEntry, iter_zip_archive
+from .base import ChunkStore, StoredChunk, RequestBodyParts, iter_upload_file, iter_request_body, iter_bytes
+from .checksums import CHECKSUM_ALGORITHMS, ChunkChecksum, make_chunk_checksum, make_digest, parse_chunk_checksum
+from .compression import is_compressible, is_compressed_type
+from .disk import DiskChunkStore
+from .responses import ByteRangeResponse, ChunkRangeResponse, media_type_for, parse_range_header
+from .static import UploadsStaticFiles
+from .uploads import assembled_file_path
+
+
+def get_chunk_store() -> ChunkStore:
+    store_type = {
+        "disk": DiskChunkStore,
+    }
+    return store_type[config.CHUNK_STORE_BACKEND](root=config.UPLOADS_DIR)
+
+
+chunk_store: ChunkStore = get_chunk_store()
+
+__all__ = [
+    "ChunkStore",
+    "StoredChunk",
+    "ChunkChecksum",
+    "CHECKSUM_ALGORITHMS",
+    "make_chunk_checksum",
+    "make_digest",
+    "parse_chunk_checksum",
+    "is_compressible",
+    "is_compressed_type",
+    "DiskChunkStore",
+    "UploadsStaticFiles",
+    "ByteRangeResponse",
+    "ChunkRangeResponse",
+    "media_type_for",
+    "parse_range_header",
+    "assembled_file_path",
+    "chunk_store",
+    "iter_upload_file",
+    "iter_request_body",
+    "iter_bytes",
+    "RequestBodyParts",
+    "ArchiveEntry",
+    "iter_zip_archive",
+]
@@ -0,0 +1,91 @@
+import os
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+import anyio
+from pydantic import BaseModel, Field
+
+from app.core.config import config
+
+
+class ArchiveEntry(BaseModel):
+    name: str = Field(..., description="Path inside the archive, ending with / for a directory")
+    path: Optional[str] = Field(default=None, description="File on disk holding the content, None for a directory")
+    modified: datetime = Field(..., description="Modification time recorded in the archive")
+    compress: bool = Field(default=True, description="Deflate the content, False to store it as is")
+
+
+class ArchiveBuffer:
+    """
+    Write-only file object ZipFile writes the archive into. It is not
+    seekable, so ZipFile puts sizes and CRCs in data descriptors and never
+    rewinds, and what it wrote is taken out with `drain` after every block.
+    """
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def zip_info(entry: ArchiveEntry, size: int) -> zipfile.ZipInfo:
+    # ZIP timestamps start in 1980
+    date_time = max(entry.modified.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+    info = zipfile.ZipInfo(entry.name, date_time=date_time)
+    if entry.path is None:
+        info.external_attr = 0o40755 << 16 | 0x10
+        return info
+    info.external_attr = 0o644 << 16
+    info.compress_type = zipfile.ZIP_DEFLATED if entry.compress else zipfile.ZIP_STORED
+    # A known size lets ZipFile switch to ZIP64 records for entries over 4 GiB
+    info.file_size = size
+    return info
+
+
+async def iter_zip_archive(entries: List[ArchiveEntry]) -> AsyncIterator[bytes]:
+    """
+    Streams a ZIP archive of `entries`, built as it is sent: no temporary
+    file, and memory bounded by one CHUNK_STORE_BLOCK_SIZE block whatever
+    the archive size. ZIP64 records are written where sizes or offsets need
+    them. Files that disappeared since the listing are left out.
+    """
+    block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+    buffer = ArchiveBuffer()
+    archive = zipfile.ZipFile(buffer, "w", allowZip64=True)
+
+    for entry in entries:
+        if entry.path is None:
+            archive.writestr(zip_info(entry, 0), b"")
+            yield buffer.drain()
+            continue
+
+        try:
+            handle = await anyio.to_thread.run_sync(open, entry.path, "rb")
+        except FileNotFoundError:
+            continue
+        with handle:
+            size = os.fstat(handle.fileno()).st_size
+            with archive.open(zip_info(entry, size), "w") as member:
+
+                def copy_block() -> int:
+                    block = handle.read(block_size)
+                    member.write(block)
+                    return len(block)
+
+                while await anyio.to_thread.run_sync(copy_block):
+                    yield buffer.drain()
+        yield buffer.drain()
+
+    archive.close()
+    yield buffer.drain()
@@ -0,0 +1,160 @@
+from abc import ABC, abstractmethod
+from http import HTTPStatus
+from typing import AsyncIterator, BinaryIO, Optional
+
+from fastapi import Request, UploadFile
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import config
+from app.core.exceptions import CustomException
+
+from .checksums import ChunkChecksum
+
+
+class StoredChunk(BaseModel):
+    length: int = Field(..., description="Number of payload bytes received")
+    checksum: str = Field(..., description="Hex encoded SHA-256 of the payload, also its key in the store")
+    crc32c: Optional[str] = Field(default=None, description="Hex encoded CRC32C, computed when the client sent one")
+    staged: Optional[str] = Field(default=None, description="Location of the payload until it is persisted")
+    compressible: bool = Field(default=False, description="Whether persisting the payload may compress it")
+
+
+class ChunkStore(ABC):
+    """
+    Keeps chunk payloads outside the database, addressed by their SHA-256 so
+    identical chunks are stored once. The `chunks` table only holds the
+    metadata returned by `write`, and `chunk_blobs` counts the references.
+
+    `write` only stages the payload. The caller persists it when the
+    reference it records is the first one, and discards it otherwise. An
+    expected checksum is verified as the payload streams in, and a mismatch
+    raises ChecksumMismatchException before anything is staged.
+
+    A store may keep a compressible payload compressed. `persist` returns
+    the number of bytes it actually takes, and `open` always reads the
+    original payload.
+    """
+
+    @abstractmethod
+    async def write(
+        self,
+        stream: AsyncIterator[bytes],
+        expected_checksum: Optional[ChunkChecksum] = None,
+        compressible: bool = False,
+    ) -> StoredChunk:
+        pass
+
+    @abstractmethod
+    def exists(self, checksum: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def persist(self, stored: StoredChunk) -> int:
+        pass
+
+    @abstractmethod
+    async def discard(self, stored: StoredChunk) -> None:
+        pass
+
+    @abstractmethod
+    def open(self, checksum: str) -> BinaryIO:
+        pass
+
+    def is_compressed(self, checksum: str) -> bool:
+        return False
+
+    @abstractmethod
+    def unlink(self, checksum: str) -> None:
+        pass
+
+    async def delete(self, checksum: str) -> None:
+        await run_in_threadpool(self.unlink, checksum)
+
+
+async def iter_upload_file(upload: UploadFile, block_size: int = None) -> AsyncIterator[bytes]:
+    block_size = block_size or int(config.CHUNK_STORE_BLOCK_SIZE)
+    while True:
+        block = await upload.read(block_size)
+        if not block:
+            break
+        yield block
+
+
+async def iter_bytes(data: bytes, block_size: int = None) -> AsyncIterator[memoryview]:
+    block_size = block_size or int(config.CHUNK_STORE_BLOCK_SIZE)
+    view = memoryview(data)
+    for start in range(0, len(view), block_size):
+        yield view[start:start + block_size]
+
+
+async def iter_request_body(request: Request, limit: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Yields the raw request body as it arrives, without multipart parsing or
+    spooling. Stops with 413 as soon as more than `limit` bytes were sent.
+    """
+    received = 0
+    async for block in request.stream():
+        received += len(block)
+        if limit is not None and received > limit:
+            raise CustomException(
+                code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                message=f"Request body is larger than {limit} bytes",
+            )
+        if block:
+            yield block
+
+
+class RequestBodyParts:
+    """
+    Splits a raw request body into consecutive parts, each read with
+    `part(size)` as a stream for its own `ChunkStore.write`. The body is
+    limited to `limit` bytes like `iter_request_body`. A client that
+    disconnects ends the current part early instead of failing it, so what
+    arrived can still be kept; `disconnected` tells it happened. `digest`,
+    a hashlib style object, sees every byte of the body.
+    """
+
+    def __init__(self, request: Request, limit: int, digest=None) -> None:
+        self.blocks = request.stream().__aiter__()
+        self.limit = limit
+        self.digest = digest
+        self.pending = memoryview(b"")
+        self.received = 0
+        self.ended = False
+        self.disconnected = False
+
+    @property
+    def exhausted(self) -> bool:
+        return self.ended and not self.pending
+
+    async def next_block(self) -> None:
+        while not self.pending and not self.ended:
+            try:
+                block = await self.blocks.__anext__()
+            except StopAsyncIteration:
+                self.ended = True
+                return
+            except ClientDisconnect:
+                self.ended = self.disconnected = True
+                return
+            self.received += len(block)
+            if self.received > self.limit:
+                raise CustomException(
+                    code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                    message=f"Request body is larger than {self.limit} bytes",
+                )
+            if self.digest is not None:
+                self.digest.update(block)
+            self.pending = memoryview(block)
+
+    async def part(self, size: int) -> AsyncIterator[memoryview]:
+        remaining = size
+        while remaining:
+            await self.next_block()
+            if not self.pending:
+                return
+            piece, self.pending = self.pending[:remaining], self.pending[remaining:]
+            remaining -= len(piece)
+            yield piece
@@ -0,0 +1,65 @@
+import hashlib
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.exceptions import BadRequestException
+
+try:
+    import crc32c as crc32c_lib
+except ImportError:  # CRC32C checksums are only accepted when the package is installed
+    crc32c_lib = None
+
+
+DIGEST_LENGTHS = {"sha256": 64, "crc32c": 8}
+CHECKSUM_ALGORITHMS = tuple(
+    algorithm for algorithm in DIGEST_LENGTHS if algorithm != "crc32c" or crc32c_lib is not None
+)
+
+
+class ChunkChecksum(BaseModel):
+    algorithm: str = Field(..., description="sha256 or crc32c")
+    value: str = Field(..., description="Lower case hex digest, CRC32C as 8 big endian digits")
+
+
+class Crc32c:
+    """
+    Incremental CRC32C with the hashlib update/hexdigest interface.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data) -> None:
+        self.value = crc32c_lib.crc32c(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+def make_digest(algorithm: str):
+    # Incremental hasher producing `ChunkChecksum.value` for the algorithm
+    return hashlib.sha256() if algorithm == "sha256" else Crc32c()
+
+
+def make_chunk_checksum(algorithm: str, value: str) -> ChunkChecksum:
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise BadRequestException(message=f"Unsupported checksum algorithm {algorithm}")
+    value = value.strip().lower()
+    if len(value) != DIGEST_LENGTHS[algorithm] or any(digit not in "0123456789abcdef" for digit in value):
+        raise BadRequestException(message=f"Malformed {algorithm} checksum")
+    return ChunkChecksum(algorithm=algorithm, value=value)
+
+
+def parse_chunk_checksum(value: Optional[str]) -> Optional[ChunkChecksum]:
+    """
+    Reads a client checksum given as `<algorithm>=<hex digest>`, or as a bare
+    hex SHA-256.
+    """
+    if not value:
+        return None
+    algorithm, separator, digest = value.partition("=")
+    if not separator:
+        algorithm, digest = "sha256", algorithm
+    return make_chunk_checksum(algorithm.strip(), digest)
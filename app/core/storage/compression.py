@@ -0,0 +1,91 @@
+import os
+from typing import BinaryIO, Optional
+
+from app.core.config import config
+
+try:
+    import zstandard
+except ImportError:  # Chunks are stored uncompressed when the package is not installed
+    zstandard = None
+
+
+# File types whose content is already compressed, by MIME type or extension
+COMPRESSED_TYPE_PREFIXES = ("image/", "video/", "audio/")
+COMPRESSED_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/zstd",
+    "application/pdf",
+    "application/epub+zip",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+COMPRESSED_EXTENSIONS = {
+    "jpg", "jpeg", "png", "gif", "webp", "heic", "avif",
+    "mp4", "mkv", "mov", "webm", "avi", "mp3", "aac", "ogg", "flac", "m4a",
+    "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "zst",
+    "pdf", "docx", "xlsx", "pptx", "epub", "apk",
+}
+
+
+def compression_enabled() -> bool:
+    return zstandard is not None and config.CHUNK_COMPRESSION == "zstd"
+
+
+def is_compressed_type(file_type: Optional[str]) -> bool:
+    """
+    Tells whether files of this type, a MIME type or an extension, are
+    already compressed: media, archives and office documents.
+    """
+    if not file_type:
+        return False
+    file_type = file_type.strip().lower()
+    if file_type.startswith(COMPRESSED_TYPE_PREFIXES):
+        # SVG and other XML based images are text
+        return not file_type.endswith("+xml")
+    return file_type in COMPRESSED_TYPES or file_type.rsplit(".", 1)[-1] in COMPRESSED_EXTENSIONS
+
+
+def is_compressible(file_type: Optional[str]) -> bool:
+    """
+    Tells whether chunks of a file of this type are worth a compression
+    trial. Already compressed media, archives and documents are not.
+    """
+    return compression_enabled() and not is_compressed_type(file_type)
+
+
+def compress_file(source: str, target: str) -> Optional[int]:
+    """
+    Writes a zstd compressed copy of `source` to `target` and returns its
+    size, or returns None without writing anything when a trial on the
+    first CHUNK_COMPRESSION_TRIAL_SIZE bytes, or the final result, does not
+    reach CHUNK_COMPRESSION_MIN_RATIO.
+    """
+    min_ratio = float(config.CHUNK_COMPRESSION_MIN_RATIO)
+    compressor = zstandard.ZstdCompressor(level=int(config.CHUNK_COMPRESSION_LEVEL))
+    size = os.path.getsize(source)
+    with open(source, "rb") as handle:
+        sample = handle.read(int(config.CHUNK_COMPRESSION_TRIAL_SIZE))
+        if not sample or len(sample) < min_ratio * len(compressor.compress(sample)):
+            return None
+        handle.seek(0)
+        with open(target, "wb") as compressed:
+            compressor.copy_stream(handle, compressed, size=size)
+
+    stored_size = os.path.getsize(target)
+    if size < min_ratio * stored_size:
+        os.unlink(target)
+        return None
+    return stored_size
+
+
+def open_decompressed(path) -> BinaryIO:
+    # Decompresses as it is read, a chunk is never inflated in memory as a whole
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from collections import Counter
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.exceptions import ChecksumMismatchException
+
+from .base import ChunkStore, StoredChunk
+from .checksums import ChunkChecksum, Crc32c
+from .compression import compress_file, open_decompressed
+
+
+class DiskChunkStore(ChunkStore):
+    """
+    Stores every distinct payload once under `<root>/.chunks/<ab>/<sha256>`,
+    or `<sha256>.zst` when it was worth compressing. Payloads are streamed to
+    a staging file while hashed and moved into place when persisted.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root) / ".chunks"
+        self.staging = self.root / "staging"
+        # Bytes persisted by this process, before and after compression
+        self.stats = Counter()
+
+    def path(self, checksum: str) -> Path:
+        return self.root / checksum[:2] / checksum
+
+    async def write(
+        self,
+        stream: AsyncIterator[bytes],
+        expected_checksum: Optional[ChunkChecksum] = None,
+        compressible: bool = False,
+    ) -> StoredChunk:
+        expected_sha256 = None
+        crc = None
+        if expected_checksum is not None:
+            if expected_checksum.algorithm == "sha256":
+                expected_sha256 = expected_checksum.value
+            else:
+                crc = Crc32c()
+
+        # Content the client announces and we already hold is only hashed, never written
+        if expected_sha256 and self.exists(expected_sha256):
+            digest = hashlib.sha256()
+            length = 0
+            async for block in stream:
+                digest.update(block)
+                length += len(block)
+            if digest.hexdigest() != expected_sha256:
+                raise ChecksumMismatchException()
+            return StoredChunk(length=length, checksum=expected_sha256)
+
+        await run_in_threadpool(self.staging.mkdir, parents=True, exist_ok=True)
+        staged = self.staging / f"{uuid4().hex}.part"
+
+        digest = hashlib.sha256()
+        length = 0
+        handle = await run_in_threadpool(open, staged, "wb")
+        try:
+            async for block in stream:
+                digest.update(block)
+                if crc is not None:
+                    crc.update(block)
+                length += len(block)
+                await run_in_threadpool(handle.write, block)
+            await run_in_threadpool(handle.close)
+        except BaseException:
+            handle.close()
+            staged.unlink(missing_ok=True)
+            raise
+
+        stored = StoredChunk(
+            length=length,
+            checksum=digest.hexdigest(),
+            crc32c=crc.hexdigest() if crc is not None else None,
+            staged=str(staged),
+            compressible=compressible,
+        )
+        actual = stored.checksum if expected_sha256 else stored.crc32c
+        if expected_checksum is not None and actual != expected_checksum.value:
+            await run_in_threadpool(staged.unlink, missing_ok=True)
+            raise ChecksumMismatchException()
+        return stored
+
+    def exists(self, checksum: str) -> bool:
+        return self.path(checksum).exists() or self.compressed_path(checksum).exists()
+
+    def compressed_path(self, checksum: str) -> Path:
+        return self.root / checksum[:2] / f"{checksum}.zst"
+
+    def is_compressed(self, checksum: str) -> bool:
+        return self.compressed_path(checksum).exists()
+
+    async def persist(self, stored: StoredChunk) -> int:
+        if stored.staged is None:
+            raise FileNotFoundError(f"Chunk {stored.checksum} has no staged payload to persist")
+        target = self.path(stored.checksum)
+        compressed_target = self.compressed_path(stored.checksum)
+        await run_in_threadpool(target.parent.mkdir, parents=True, exist_ok=True)
+
+        stored_size = None
+        if stored.compressible:
+            compressed = f"{stored.staged}.zst"
+            stored_size = await run_in_threadpool(compress_file, stored.staged, compressed)
+        if stored_size is not None:
+            await run_in_threadpool(os.replace, compressed, compressed_target)
+            await run_in_threadpool(os.unlink, stored.staged)
+            # A raw copy left by an earlier upload of the same content is redundant now
+            await run_in_threadpool(target.unlink, missing_ok=True)
+        else:
+            stored_size = stored.length
+            await run_in_threadpool(os.replace, stored.staged, target)
+            await run_in_threadpool(compressed_target.unlink, missing_ok=True)
+        stored.staged = None
+
+        self.stats["logical_bytes"] += stored.length
+        self.stats["stored_bytes"] += stored_size
+        self.stats["compressed_chunks" if stored_size != stored.length else "raw_chunks"] += 1
+        return stored_size
+
+    async def discard(self, stored: StoredChunk) -> None:
+        if stored.staged is not None:
+            await run_in_threadpool(Path(stored.staged).unlink, missing_ok=True)
+            stored.staged = None
+
+    def open(self, checksum: str) -> BinaryIO:
+        compressed = self.compressed_path(checksum)
+        if compressed.exists():
+            return open_decompressed(compressed)
+        return open(self.path(checksum), "rb")
+
+    def unlink(self, checksum: str) -> None:
+        self.path(checksum).unlink(missing_ok=True)
+        self.compressed_path(checksum).unlink(missing_ok=True)
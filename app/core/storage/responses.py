@@ -0,0 +1,315 @@
+import mimetypes
+import os
+import secrets
+from email.utils import formatdate
+from typing import AsyncIterator, Callable, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request, status
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import config
+from app.core.exceptions import NotFoundException
+
+from .base import ChunkStore
+
+
+# More ranges than this in one request are answered with the whole file
+MAX_RANGES = 32
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+def media_type_for(file_type: Optional[str], file_name: str) -> str:
+    """
+    `File.file_type` is whatever the client sent, a MIME type or an extension.
+    """
+    if file_type and "/" in file_type:
+        return file_type
+    guessed = None
+    if file_type:
+        guessed, _ = mimetypes.guess_type(f"file.{file_type.lstrip('.')}")
+    if guessed is None:
+        guessed, _ = mimetypes.guess_type(file_name)
+    return guessed or "application/octet-stream"
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parses a `Range: bytes=...` header into sorted, merged (start, stop)
+    ranges with an exclusive stop. Returns None when the header should be
+    ignored and the whole file served, and an empty list when no range is
+    satisfiable.
+    """
+    unit, _, specs = value.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                # Suffix range, the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size))
+                continue
+            start = int(first)
+            stop = int(last) + 1 if last else None
+        except ValueError:
+            return None
+        if start < 0 or (stop is not None and stop <= start):
+            return None
+        stop = size if stop is None else stop
+        if start < size:
+            ranges.append((start, min(stop, size)))
+
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak:
+            candidate = candidate[2:] if candidate.startswith("W/") else candidate
+        if candidate == etag:
+            return True
+    return False
+
+
+class ByteRangeResponse(Response):
+    """
+    Serves a file with conditional and partial requests: `If-None-Match`
+    answers 304, a `Range` of one range answers 206, several ranges a
+    multipart/byteranges 206, and `If-Range` falls back to the whole file
+    once the representation changed. With `bounds`, only that byte range
+    is ever served.
+
+    The body goes out through the ASGI zero-copy extension when the server
+    offers it, so the kernel sends the file with sendfile(2). Otherwise it is
+    read in CHUNK_STORE_BLOCK_SIZE blocks off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        request: Request,
+        size: int,
+        media_type: str,
+        etag: str,
+        last_modified: Optional[float] = None,
+        filename: Optional[str] = None,
+        bounds: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.bounds = bounds
+        self.media_type = media_type
+        self.background = None
+        self.ranges: List[Tuple[int, int]] = []
+        self.boundary = secrets.token_hex(16)
+        self.part_headers: List[bytes] = []
+        self.trailer = b""
+
+        headers = {"accept-ranges": "bytes", "etag": etag}
+        if last_modified is not None:
+            headers["last-modified"] = formatdate(last_modified, usegmt=True)
+        if filename is not None:
+            headers["content-disposition"] = f"inline; filename*=utf-8''{quote(filename)}"
+
+        self.status_code, extra = self.evaluate(request.headers, headers)
+        headers.update(extra)
+        self.init_headers(headers)
+
+    def evaluate(self, request_headers: Mapping[str, str], headers: Mapping[str, str]) -> Tuple[int, dict]:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, headers["etag"]):
+            return status.HTTP_304_NOT_MODIFIED, {}
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_range is not None and not (
+            etag_matches(if_range, headers["etag"], weak=False)
+            if if_range.startswith(('"', "W/"))
+            else if_range == headers.get("last-modified")
+        ):
+            range_header = None
+
+        ranges = parse_range_header(range_header, self.size) if range_header else None
+        if self.bounds is not None:
+            # Only these bytes may be served, requested ranges are clipped to them
+            low, high = self.bounds[0], min(self.bounds[1], self.size)
+            if ranges is None:
+                ranges = [(low, high)] if low < high else []
+            else:
+                ranges = [(max(start, low), min(stop, high)) for start, stop in ranges if start < high and stop > low]
+        if ranges is None:
+            self.ranges = [(0, self.size)]
+            return status.HTTP_200_OK, {"content-type": self.media_type, "content-length": str(self.size)}
+        if not ranges:
+            return status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, {
+                "content-range": f"bytes */{self.size}",
+                "content-length": "0",
+            }
+
+        self.ranges = ranges
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return status.HTTP_206_PARTIAL_CONTENT, {
+                "content-type": self.media_type,
+                "content-range": f"bytes {start}-{stop - 1}/{self.size}",
+                "content-length": str(stop - start),
+            }
+
+        self.part_headers = [
+            (
+                f"--{self.boundary}\r\n"
+                f"Content-Type: {self.media_type}\r\n"
+                f"Content-Range: bytes {start}-{stop - 1}/{self.size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, stop in ranges
+        ]
+        # Every part but the first is preceded by the CRLF ending the previous one
+        self.part_headers[1:] = [b"\r\n" + part for part in self.part_headers[1:]]
+        self.trailer = f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+        length = sum(stop - start for start, stop in ranges)
+        length += sum(len(part) for part in self.part_headers) + len(self.trailer)
+        return status.HTTP_206_PARTIAL_CONTENT, {
+            "content-type": f"multipart/byteranges; boundary={self.boundary}",
+            "content-length": str(length),
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.status_code not in (status.HTTP_200_OK, status.HTTP_206_PARTIAL_CONTENT):
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        await self.send_body(scope, send)
+        await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+
+    async def send_body(self, scope: Scope, send: Send) -> None:
+        zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        with open(self.path, "rb") as handle:
+            for index, (start, stop) in enumerate(self.ranges):
+                if self.part_headers:
+                    await send({"type": "http.response.body", "body": self.part_headers[index], "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": handle,
+                        "offset": start,
+                        "count": stop - start,
+                        "more_body": True,
+                    })
+                else:
+                    await self.send_range(send, handle.fileno(), start, stop)
+
+    async def send_range(self, send: Send, fd: int, start: int, stop: int) -> None:
+        block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+        position = start
+        while position < stop:
+            block = await anyio.to_thread.run_sync(os.pread, fd, min(block_size, stop - position), position)
+            if not block:
+                raise RuntimeError(f"{self.path} is shorter than {self.size} bytes")
+            position += len(block)
+            await send({"type": "http.response.body", "body": block, "more_body": True})
+
+
+class ChunkRangeResponse(ByteRangeResponse):
+    """
+    Serves a file that is not rebuilt yet as the concatenation of its chunks.
+    `spans(start, stop)` yields the chunks overlapping a range in order, as
+    rows with `offset`, `length`, `checksum` and `data`, so a range costs one
+    lookup of the chunk offset index however large the file is.
+
+    A rebuild finishing meanwhile may release the chunks; what is left of
+    the range is then read from the assembled file at `path`. When neither
+    holds the first byte, the file is gone and 404 is raised before the
+    response starts.
+    """
+
+    def __init__(
+        self,
+        spans: Callable[[int, int], AsyncIterator],
+        store: ChunkStore,
+        path: str,
+        request: Request,
+        size: int,
+        media_type: str,
+        etag: str,
+        filename: Optional[str] = None,
+        bounds: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        self.spans = spans
+        self.store = store
+        super().__init__(
+            path, request, size=size, media_type=media_type, etag=etag, filename=filename, bounds=bounds
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.ranges and not await self.content_exists(self.ranges[0][0]):
+            raise NotFoundException(message="File not found")
+        await super().__call__(scope, receive, send)
+
+    async def content_exists(self, position: int) -> bool:
+        async for span in self.spans(position, position + 1):
+            if span.offset <= position:
+                return True
+            break
+        return await anyio.to_thread.run_sync(os.path.exists, self.path)
+
+    async def send_body(self, scope: Scope, send: Send) -> None:
+        for index, (start, stop) in enumerate(self.ranges):
+            if self.part_headers:
+                await send({"type": "http.response.body", "body": self.part_headers[index], "more_body": True})
+            await self.send_chunk_range(send, start, stop)
+
+    async def send_chunk_range(self, send: Send, start: int, stop: int) -> None:
+        block_size = int(config.CHUNK_STORE_BLOCK_SIZE)
+        position = start
+        async for span in self.spans(start, stop):
+            if span.offset > position:
+                raise RuntimeError(f"No chunk of {self.path} holds byte {position}")
+            end = min(span.offset + span.length, stop)
+            if span.data is not None:
+                view = memoryview(span.data)[position - span.offset:end - span.offset]
+                for block_start in range(0, len(view), block_size):
+                    block = bytes(view[block_start:block_start + block_size])
+                    await send({"type": "http.response.body", "body": block, "more_body": True})
+                position = end
+                continue
+
+            try:
+                handle = await anyio.to_thread.run_sync(self.store.open, span.checksum)
+            except FileNotFoundError:
+                break
+            with handle:
+                await anyio.to_thread.run_sync(handle.seek, position - span.offset)
+                while position < end:
+                    block = await anyio.to_thread.run_sync(handle.read, min(block_size, end - position))
+                    if not block:
+                        raise RuntimeError(f"Chunk {span.checksum} is shorter than {span.length} bytes")
+                    position += len(block)
+                    await send({"type": "http.response.body", "body": block, "more_body": True})
+
+        if position < stop:
+            # The chunks were released, the file was rebuilt since the response started
+            with open(self.path, "rb") as handle:
+                await self.send_range(send, handle.fileno(), position, stop)
@@ -0,0 +1,17 @@
+import os
+from pathlib import PurePath
+from typing import Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+
+
+class UploadsStaticFiles(StaticFiles):
+    """
+    Serves rebuilt uploads while keeping hidden directories such as the chunk
+    store (`.chunks`) out of reach.
+    """
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        if any(part.startswith(".") for part in PurePath(path).parts):
+            return "", None
+        return super().lookup_path(path)
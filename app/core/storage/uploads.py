@@ -0,0 +1,10 @@
+from pathlib import Path
+
+from app.core.config import config
+
+
+def assembled_file_path(file_id: int, file_name: str) -> Path:
+    """
+    Location of a rebuilt upload, also served under the /Uploads mount.
+    """
+    return Path(config.UPLOADS_DIR) / f"{file_id}-{file_name}"
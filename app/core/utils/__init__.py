@@ -2,6 +2,9 @@ from .token_helper import TokenHelper, JwtService
 # from .machine_service import MachineService
 from .password_utils import Verify_password, Hash_password
 from .validator import Validation
+from .bitmap import bitmap_size, is_bit_set, missing_ranges
+from .signed_url import DownloadGrant, SignedUrlService
+from .possession import PossessionChallenge, PossessionService, possession_proof
 
 __all__ = [   
     "Validation",
@@ -10,4 +13,12 @@ __all__ = [
     # "MachineService", 
     "Verify_password", 
     "Hash_password",
+    "bitmap_size",
+    "is_bit_set",
+    "missing_ranges",
+    "DownloadGrant",
+    "SignedUrlService",
+    "PossessionChallenge",
+    "PossessionService",
+    "possession_proof",
 ]
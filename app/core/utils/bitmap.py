@@ -0,0 +1,35 @@
+from typing import List
+
+
+def bitmap_size(bits: int) -> int:
+    return (bits + 7) // 8
+
+
+def is_bit_set(bitmap: bytes, index: int) -> bool:
+    # Same bit order as Postgres get_bit/set_bit on bytea: least significant bit first
+    return bool(bitmap[index >> 3] & (1 << (index & 7)))
+
+
+def missing_ranges(bitmap: bytes, bits: int) -> List[List[int]]:
+    """
+    Returns the inclusive [start, end] ranges of unset bits among the first `bits`.
+    """
+    ranges = []
+    start = None
+    for byte_index in range(bitmap_size(bits)):
+        byte = bitmap[byte_index]
+        # Whole bytes that are fully set or fully unset need no per-bit work
+        if byte == 0xFF and start is None:
+            continue
+        if byte == 0x00 and start is not None:
+            continue
+        for index in range(byte_index * 8, min(byte_index * 8 + 8, bits)):
+            if byte & (1 << (index & 7)):
+                if start is not None:
+                    ranges.append([start, index - 1])
+                    start = None
+            elif start is None:
+                start = index
+    if start is not None:
+        ranges.append([start, bits - 1])
+    return ranges
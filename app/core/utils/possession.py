@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import List, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from app.core.config import config
+from app.core.exceptions import ForbiddenException, GoneException
+
+from .signed_url import decode_segment, encode_segment, signature
+
+
+class PossessionChallenge(BaseModel):
+    token: str = Field(..., description="Sent back with the proof, it carries the challenge itself")
+    nonce: str = Field(..., description="Hex encoded bytes the proof starts with")
+    ranges: List[Tuple[int, int]] = Field(..., description="(offset, length) of the file bytes the proof covers, in order")
+    expires_at: int = Field(..., description="Unix time after which the proof is refused")
+
+
+def possession_proof(path, nonce: str, ranges: List[Tuple[int, int]]) -> str:
+    """
+    SHA-256 of the nonce followed by the bytes of each range of the file.
+    """
+    digest = hashlib.sha256(bytes.fromhex(nonce))
+    with open(path, "rb") as handle:
+        for offset, length in ranges:
+            digest.update(os.pread(handle.fileno(), length, offset))
+    return digest.hexdigest()
+
+
+class PossessionService:
+    """
+    Instant uploads must show they hold the file's content, not only its
+    SHA-256 and size, which may have leaked. The server picks a nonce and
+    random byte ranges, and the client answers with `possession_proof` over
+    its own copy. Challenges are signed like download links, so nothing is
+    kept between the two requests.
+    """
+
+    @staticmethod
+    def issue(user_id: UUID, content_hash: str, size: int) -> PossessionChallenge:
+        length = min(int(config.INSTANT_UPLOAD_PROOF_RANGE_SIZE), size)
+        ranges = sorted(
+            (secrets.randbelow(size - length + 1), length)
+            for _ in range(int(config.INSTANT_UPLOAD_PROOF_RANGES) if length else 0)
+        )
+        nonce = secrets.token_hex(16)
+        expires = int(time.time()) + int(config.INSTANT_UPLOAD_PROOF_TTL)
+        payload = encode_segment(json.dumps(
+            [str(user_id), content_hash, size, nonce, ranges, expires],
+            separators=(",", ":"),
+        ).encode())
+        return PossessionChallenge(
+            token=f"{payload}.{signature(payload, 'possession')}",
+            nonce=nonce,
+            ranges=ranges,
+            expires_at=expires,
+        )
+
+    @staticmethod
+    def verify(token: str, user_id: UUID, content_hash: str, size: int) -> PossessionChallenge:
+        payload, _, signed = token.partition(".")
+        if not hmac.compare_digest(signed.encode(), signature(payload, "possession").encode()):
+            raise ForbiddenException(message="Invalid challenge")
+        challenged_user, challenged_hash, challenged_size, nonce, ranges, expires = json.loads(decode_segment(payload))
+        if expires < time.time():
+            raise GoneException(message="Challenge expired")
+        if (challenged_user, challenged_hash, challenged_size) != (str(user_id), content_hash, size):
+            raise ForbiddenException(message="Challenge was issued for another upload")
+        return PossessionChallenge(token=token, nonce=nonce, ranges=ranges, expires_at=expires)
@@ -1,8 +1,10 @@
-from .models import User, File, Chunk, Folder
+from .models import User, File, Chunk, ChunkBlob, Folder, UploadSession
 
 __all__ = [
     "User",
     "File",
     "Chunk",
-    "Folder"
+    "ChunkBlob",
+    "Folder",
+    "UploadSession"
 ]
\ No newline at end of file
@@ -3,9 +3,11 @@ from sqlalchemy import (
     Integer,
     String,
     ForeignKey,
+    Index,
     BigInteger,
     Boolean,
     LargeBinary,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 from app.core.db import get_async_session
@@ -37,6 +39,12 @@ class User(Base, TimestampMixin):
 
 class Folder(Base, TimestampMixin):
     __tablename__ = 'folders'
+    __table_args__ = (
+        # A user's folders, newest first
+        Index('ix_folders_user_id_created_at', 'user_id', 'created_at'),
+        # Walks down a folder tree
+        Index('ix_folders_parent_id', 'parent_id'),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     parent_id = Column(UUID(as_uuid=True), ForeignKey('folders.id'), nullable=True)
@@ -51,6 +59,22 @@ class Folder(Base, TimestampMixin):
 
 class File(Base, TimestampMixin):
     __tablename__ = 'files'
+    __table_args__ = (
+        # Listings of a folder, or of the files outside any folder, newest first
+        Index('ix_files_user_id_folder_id_created_at', 'user_id', 'folder_id', 'created_at'),
+        # Chunked uploads find their file by name
+        Index('ix_files_user_id_file_name', 'user_id', 'file_name'),
+        Index('ix_files_folder_id', 'folder_id'),
+        # Instant uploads only match rebuilt files
+        Index(
+            'ix_files_content_hash_size_ready',
+            'content_hash',
+            'size',
+            postgresql_where=text('is_ready IS true'),
+        ),
+        # The sweeper looks for idle incomplete files
+        Index('ix_files_incomplete_edited_at', 'edited_at', postgresql_where=text('is_complete IS NOT true')),
+    )
     file_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'))
     folder_id = Column(UUID(as_uuid=True), ForeignKey('folders.id'), nullable=True)
@@ -59,19 +83,60 @@ class File(Base, TimestampMixin):
     is_complete = Column(Boolean, default=False)
     size = Column(BigInteger)
     file_type = Column(String, nullable=True)
+    # SHA-256 of the whole file, known once it has been rebuilt
+    content_hash = Column(String(64), nullable=True)
+    # True once Uploads/{file_id}-{file_name} exists
+    is_ready = Column(Boolean, default=False)
     # Ensure chunks are deleted when the file is deleted
     chunks = relationship("Chunk", back_populates="file", cascade="all, delete-orphan")  
+    upload_session = relationship("UploadSession", back_populates="file", uselist=False, cascade="all, delete-orphan")
     owner = relationship("User", back_populates="files")
     folder = relationship("Folder", back_populates="files")
 
 
 class Chunk(Base, TimestampMixin):
     __tablename__ = 'chunks'
+    __table_args__ = (
+        # A retried chunk overwrites its earlier attempt instead of adding a row
+        Index('ix_chunks_file_id_sequence_number', 'file_id', 'sequence_number', unique=True),
+        # Maps a byte position of the file to the chunk holding it
+        Index('ix_chunks_file_id_offset', 'file_id', 'offset'),
+    )
     chunk_id = Column(Integer, primary_key=True, index=True)
     file_id = Column(Integer, ForeignKey('files.file_id'))
     sequence_number = Column(Integer)
-    data = Column(LargeBinary)
+    offset = Column(BigInteger, nullable=True)
+    length = Column(BigInteger, nullable=True)
+    # SHA-256 of the payload, also the key of its ChunkBlob
+    checksum = Column(String(64), nullable=True)
+    # CRC32C the client sent with the chunk and the server verified, as hex
+    crc32c = Column(String(8), nullable=True)
+    # Payloads live in the chunk store; only chunks uploaded before it existed keep their bytes here
+    data = Column(LargeBinary, nullable=True)
     is_received = Column(Boolean, default=False)
     # Link back to the file
     file = relationship("File", back_populates="chunks")
- 
\ No newline at end of file
+
+
+class ChunkBlob(Base, TimestampMixin):
+    __tablename__ = 'chunk_blobs'
+    content_hash = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    # Bytes the payload takes in the chunk store when it was stored compressed
+    stored_size = Column(BigInteger, nullable=True)
+    # Number of chunks, across all files, whose payload is this blob
+    ref_count = Column(Integer, default=0, nullable=False)
+
+
+class UploadSession(Base, TimestampMixin):
+    __tablename__ = 'upload_sessions'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_id = Column(Integer, ForeignKey('files.file_id'), nullable=False, unique=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    chunk_size = Column(BigInteger, nullable=False)
+    # Bit n (least significant bit first, as Postgres set_bit numbers them) is set once chunk n is stored
+    received = Column(LargeBinary, nullable=False)
+    received_count = Column(Integer, default=0, nullable=False)
+    # Bytes stored so far, the Upload-Offset of tus uploads whose chunks vary in size
+    received_bytes = Column(BigInteger, default=0, nullable=False)
+    file = relationship("File", back_populates="upload_session")
@@ -1,4 +1,22 @@
-from .schemas import FileChunk, GoogleLoginRequest, EmailValidate, UserBase, Usage, FolderSchemaRequest, UserFoldersResponse
+from .schemas import (
+    FileChunk,
+    GoogleLoginRequest,
+    EmailValidate,
+    UserBase,
+    Usage,
+    FolderSchemaRequest,
+    UserFoldersResponse,
+    UploadSessionRequest,
+    UploadSessionResponse,
+    UploadSessionStatus,
+    InstantUploadRequest,
+    InstantUploadResponse,
+    BatchChunk,
+    BatchChunkStatus,
+    BatchUploadResponse,
+    DownloadLinkRequest,
+    DownloadLinkResponse,
+)
 
 __all__ = [
     "FileChunk",
@@ -7,5 +25,15 @@ __all__ = [
     "UserBase",
     "Usage",
     "FolderSchemaRequest",
-    "UserFoldersResponse"
+    "UserFoldersResponse",
+    "UploadSessionRequest",
+    "UploadSessionResponse",
+    "UploadSessionStatus",
+    "InstantUploadRequest",
+    "InstantUploadResponse",
+    "BatchChunk",
+    "BatchChunkStatus",
+    "BatchUploadResponse",
+    "DownloadLinkRequest",
+    "DownloadLinkResponse",
 ]
@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, EmailStr, UUID4
 from typing import Optional, List
 from datetime import datetime
 
+from app.core.utils import PossessionChallenge
+
 
 class FolderSchemaRequest(BaseModel):
     name: str
@@ -34,6 +36,84 @@ class FileChunk(BaseModel):
     file_type: str = Field(..., description="File type")
 
 
+class UploadSessionRequest(BaseModel):
+    file_name: str = Field(..., description="Name of the Uploaded file")
+    total_file_size: int = Field(..., ge=0, description="Total file size of the Uploaded file")
+    chunk_size: int = Field(..., gt=0, description="Size of every chunk except the last one")
+    file_type: str = Field(..., description="File type")
+    folder_id: Optional[UUID4] = None
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: UUID4
+    file_id: int
+    chunk_size: int
+    total_chunks: int
+
+
+class UploadSessionStatus(UploadSessionResponse):
+    received_chunks: int
+    missing: List[List[int]] = Field(..., description="Inclusive ranges of sequence numbers not received yet")
+    is_complete: bool
+
+
+class InstantUploadRequest(BaseModel):
+    file_name: str = Field(..., description="Name of the Uploaded file")
+    total_file_size: int = Field(..., ge=0, description="Total file size of the Uploaded file")
+    content_hash: str = Field(..., min_length=64, max_length=64, description="Hex encoded SHA-256 of the whole file")
+    file_type: str = Field(..., description="File type")
+    folder_id: Optional[UUID4] = None
+    challenge: Optional[str] = Field(default=None, description="`challenge.token` of the previous reply")
+    proof: Optional[str] = Field(
+        default=None,
+        description="Hex encoded SHA-256 of the challenge nonce followed by the file bytes of each challenge range",
+    )
+
+
+class InstantUploadResponse(BaseModel):
+    is_complete: bool = Field(..., description="True when the file was created without sending any chunk")
+    file_id: Optional[int] = None
+    challenge: Optional[PossessionChallenge] = Field(
+        default=None, description="Send the request again with its token and proof to complete the upload"
+    )
+
+
+class BatchChunk(BaseModel):
+    file_name: str = Field(..., description="Name of the Uploaded file")
+    total_file_size: int = Field(..., ge=0, description="Total file size of the Uploaded file")
+    sequence_number: int = Field(..., ge=0, description="Sequence number of the Chunked Uploaded file")
+    total_chunks: int = Field(..., gt=0, description="Total chunks to be uploaded from the frontend")
+    file_type: str = Field(..., description="File type")
+    folder_id: Optional[UUID4] = None
+    checksum: Optional[str] = Field(default=None, description="Checksum of the chunk as `sha256=<hex>`, `crc32c=<hex>` or a bare hex SHA-256")
+
+
+class BatchChunkStatus(BaseModel):
+    index: int = Field(..., description="Position of the chunk in the manifest")
+    file_name: str
+    sequence_number: int
+    file_id: Optional[int] = None
+    status: str = Field(..., description="stored, unchanged, superseded or rejected")
+    detail: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    chunks: List[BatchChunkStatus]
+    completed_file_ids: List[int] = Field(..., description="Files whose last missing chunk was in this batch")
+
+
+class DownloadLinkRequest(BaseModel):
+    expires_in: Optional[int] = Field(default=None, gt=0, description="Seconds the link stays valid, DOWNLOAD_URL_TTL by default")
+    range_start: Optional[int] = Field(default=None, ge=0, description="First byte the link gives access to")
+    range_end: Optional[int] = Field(default=None, ge=0, description="Last byte the link gives access to, inclusive")
+    bind_ip: bool = Field(default=False, description="Only accept the link from the address requesting it")
+
+
+class DownloadLinkResponse(BaseModel):
+    url: str
+    expires_at: int = Field(..., description="Unix time the link expires at")
+
+
 class EmailValidate(BaseModel):
     email: EmailStr
 
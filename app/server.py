@@ -4,18 +4,21 @@ from fastapi import FastAPI, Request, Depends
 from fastapi.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
 
 from app.api import router
 from app.core.config import config
 from app.core.exceptions import CustomException
 from app.core.dependencies import Logging
+from app.core.storage import UploadsStaticFiles
 from app.core.middlewares import (
     AuthenticationMiddleware,
     AuthBackend,
     SQLAlchemyMiddleware,
+    ReadYourWritesMiddleware,
     ResponseLogMiddleware,
 )
+from app.core.db.routing import replica_lag
+from app.core.db.session import engines
 
 
 def init_routers(app_: FastAPI) -> None:
@@ -29,8 +32,17 @@ def init_listeners(app_: FastAPI) -> None:
         return JSONResponse(
             status_code=exc.code,
             content={"success": exc.success, "message": exc.message},
+            headers=exc.headers,
         )
 
+    @app_.on_event("startup")
+    async def start_replica_lag_probe():
+        replica_lag.start(engines["reader"], same_database=config.READER_DB_URL == config.WRITER_DB_URL)
+
+    @app_.on_event("shutdown")
+    async def stop_replica_lag_probe():
+        await replica_lag.stop()
+
 
 def on_auth_error(request: Request, exc: Exception):
     status_code, success, message = 401, None, str(exc)
@@ -53,13 +65,28 @@ def make_middleware() -> List[Middleware]:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            # Read by browser tus clients and ranged downloads
+            expose_headers=[
+                "Location",
+                "Upload-Offset",
+                "Upload-Length",
+                "Tus-Resumable",
+                "Tus-Version",
+                "Tus-Extension",
+                "Accept-Ranges",
+                "Content-Range",
+                "Content-Disposition",
+                "ETag",
+            ],
         ),
+        # Outside authentication, so the user lookup uses the request's session
+        Middleware(SQLAlchemyMiddleware),
         Middleware(
             AuthenticationMiddleware,
             backend=AuthBackend(),
             on_error=on_auth_error,
         ),
-        Middleware(SQLAlchemyMiddleware),
+        Middleware(ReadYourWritesMiddleware),
         Middleware(ResponseLogMiddleware),
     ]
     return middleware
@@ -76,7 +103,7 @@ def create_app() -> FastAPI:
     )
 
     # Mount the "uploads" directory as a static folder
-    app_.mount("/Uploads", StaticFiles(directory="Uploads"), name="uploads")
+    app_.mount("/Uploads", UploadsStaticFiles(directory=config.UPLOADS_DIR), name="uploads")
 
     init_routers(app_=app_)
     init_listeners(app_=app_)
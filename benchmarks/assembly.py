@@ -0,0 +1,95 @@
+"""
+Compares the rebuild throughput of each assembly strategy in
+app/api/file_uploads/tasks.py against joining every chunk in memory, which is
+what rebuild_file did before chunks were streamed.
+
+Run it from the project root, with the application's environment, on the
+filesystem that holds the Uploads volume:
+
+    pipenv run python -m benchmarks.assembly --directory Uploads/.bench
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from app.api.file_uploads.tasks import ASSEMBLY_STRATEGIES, assemble_chunk
+
+
+def make_chunks(directory, chunks, chunk_size):
+    paths = []
+    for index in range(chunks):
+        path = os.path.join(directory, f"chunk-{index:08d}")
+        with open(path, "wb") as handle:
+            handle.write(os.urandom(chunk_size))
+        paths.append(path)
+    return paths
+
+
+def join_in_memory(paths, target_path):
+    chunks_data = []
+    for path in paths:
+        with open(path, "rb") as handle:
+            chunks_data.append(handle.read())
+    file_data = b"".join(chunks_data)
+    with open(target_path, "wb") as target:
+        target.write(file_data)
+    return hashlib.sha256(file_data).hexdigest()
+
+
+def assemble(paths, target_path, strategy):
+    digest = hashlib.sha256()
+    with open(target_path, "wb") as target:
+        for path in paths:
+            with open(path, "rb") as source:
+                count = os.fstat(source.fileno()).st_size
+                assemble_chunk(source.fileno(), target.fileno(), count, digest, strategy)
+    return digest.hexdigest()
+
+
+def measure(run, rounds):
+    best = None
+    result = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--directory", default=None, help="Where chunks and results are written")
+    args = parser.parse_args()
+
+    if args.directory:
+        os.makedirs(args.directory, exist_ok=True)
+    directory = tempfile.mkdtemp(dir=args.directory)
+    try:
+        paths = make_chunks(directory, args.chunks, args.chunk_size)
+        target_path = os.path.join(directory, "assembled")
+        total_mb = args.chunks * args.chunk_size / (1024 * 1024)
+
+        runs = [("b''.join", lambda: join_in_memory(paths, target_path))]
+        for strategy in ASSEMBLY_STRATEGIES:
+            runs.append((strategy, lambda strategy=strategy: assemble(paths, target_path, strategy)))
+
+        expected = None
+        print(f"{args.chunks} chunks of {args.chunk_size} bytes ({total_mb:.0f} MB), best of {args.rounds}")
+        for name, run in runs:
+            elapsed, digest = measure(run, args.rounds)
+            expected = expected or digest
+            status = "" if digest == expected else "  DIGEST MISMATCH"
+            print(f"{name:>16}: {elapsed:8.3f}s {total_mb / elapsed:10.1f} MB/s{status}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
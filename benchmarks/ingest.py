@@ -0,0 +1,116 @@
+"""
+Compares ingesting a chunk sent as multipart form data, parsed into an
+UploadFile, with streaming the raw request body into the chunk store. Both
+paths end in DiskChunkStore.write, the database is not involved.
+
+Run it from the project root, with the application's environment:
+
+    pipenv run python -m benchmarks.ingest --directory Uploads/.bench
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.core.storage import DiskChunkStore, iter_request_body, iter_upload_file
+
+MODES = ("multipart", "raw")
+
+
+def make_app(store):
+    async def multipart(request: Request):
+        form = await request.form()
+        stored = await store.write(iter_upload_file(form["file_data"]))
+        await store.discard(stored)
+        return Response(status_code=204)
+
+    async def raw(request: Request):
+        stored = await store.write(iter_request_body(request))
+        await store.discard(stored)
+        return Response(status_code=204)
+
+    return Starlette(routes=[
+        Route("/multipart", multipart, methods=["PUT"]),
+        Route("/raw", raw, methods=["PUT"]),
+    ])
+
+
+async def upload(client, kind, payload, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send():
+        async with semaphore:
+            if kind == "multipart":
+                response = await client.put("/multipart", files={"file_data": ("chunk", payload)})
+            else:
+                response = await client.put("/raw", content=payload)
+            response.raise_for_status()
+
+    await asyncio.gather(*(send() for _ in range(requests)))
+
+
+def measure(kind, args):
+    if args.directory:
+        os.makedirs(args.directory, exist_ok=True)
+    directory = tempfile.mkdtemp(dir=args.directory)
+    try:
+        app = make_app(DiskChunkStore(root=directory))
+        payload = os.urandom(args.chunk_size)
+        total_mb = args.requests * args.chunk_size / (1024 * 1024)
+        baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                await upload(client, kind, payload, args.requests, args.concurrency)
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"{kind:>10}: {total_mb / elapsed:8.1f} MB/s {cpu * 1000 / total_mb:8.2f} ms CPU/MB"
+            f"  peak RSS {peak_mb:.0f} MB (+{peak_mb - baseline_mb:.0f} MB while uploading)"
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--directory", default=None, help="Where the chunk store is created")
+    parser.add_argument("--mode", choices=MODES, help="Measure one path in this process only")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args)
+        return
+
+    total_mb = args.requests * args.chunk_size / (1024 * 1024)
+    print(f"{args.requests} chunks of {args.chunk_size} bytes ({total_mb:.0f} MB), {args.concurrency} at a time")
+    options = ["--requests", str(args.requests), "--chunk-size", str(args.chunk_size), "--concurrency", str(args.concurrency)]
+    if args.directory:
+        options += ["--directory", args.directory]
+    # Peak RSS only ever grows, each path is measured in a process of its own
+    for mode in MODES:
+        subprocess.run([sys.executable, "-m", "benchmarks.ingest", "--mode", mode, *options], check=True)
+
+
+if __name__ == "__main__":
+    main()
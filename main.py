@@ -27,6 +27,8 @@ def main(env: str, debug: bool):
         port=config.APP_PORT,
         reload=True if config.ENV != "production" else False,
         workers=1,
+        # A WebSocket upload frame carries a whole chunk plus its 20 byte header
+        ws_max_size=int(config.UPLOAD_MAX_CHUNK_SIZE) + 20,
     )
 
 
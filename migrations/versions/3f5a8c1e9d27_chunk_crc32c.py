@@ -0,0 +1,24 @@
+"""Chunk CRC32C
+
+Revision ID: 3f5a8c1e9d27
+Revises: e7a94b3c2f61
+Create Date: 2026-10-18 18:21:35.804126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f5a8c1e9d27'
+down_revision = 'e7a94b3c2f61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chunks', sa.Column('crc32c', sa.String(length=8), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chunks', 'crc32c')
@@ -0,0 +1,37 @@
+"""Chunk store metadata
+
+Revision ID: 4b7e2d91c3a5
+Revises: 6ddeaebfcaae
+Create Date: 2026-10-18 09:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2d91c3a5'
+down_revision = '6ddeaebfcaae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chunks', sa.Column('offset', sa.BigInteger(), nullable=True))
+    op.add_column('chunks', sa.Column('length', sa.BigInteger(), nullable=True))
+    op.add_column('chunks', sa.Column('checksum', sa.String(length=64), nullable=True))
+    # Chunks written before the chunk store keep their inline payload, describe them too
+    op.execute(
+        """
+        UPDATE chunks
+        SET length = octet_length(data),
+            checksum = encode(sha256(data), 'hex')
+        WHERE data IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('chunks', 'checksum')
+    op.drop_column('chunks', 'length')
+    op.drop_column('chunks', 'offset')
@@ -0,0 +1,36 @@
+"""Chunk offset index
+
+Revision ID: 4c8e2a9f71d5
+Revises: b6d17e4f0a93
+Create Date: 2026-10-18 20:11:37.208415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2a9f71d5'
+down_revision = 'b6d17e4f0a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chunks_file_id_offset',
+            'chunks',
+            ['file_id', 'offset'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chunks_file_id_offset',
+            table_name='chunks',
+            postgresql_concurrently=True,
+        )
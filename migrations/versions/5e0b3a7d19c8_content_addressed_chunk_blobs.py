@@ -0,0 +1,60 @@
+"""Content addressed chunk blobs
+
+Revision ID: 5e0b3a7d19c8
+Revises: c2d84f1a7b36
+Create Date: 2026-10-18 13:26:51.377040
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import config
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b3a7d19c8'
+down_revision = 'c2d84f1a7b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chunk_blobs',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('edited_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.execute(
+        """
+        INSERT INTO chunk_blobs (content_hash, size, ref_count, created_at, edited_at)
+        SELECT checksum, max(length), count(*), now(), now()
+        FROM chunks
+        WHERE data IS NULL AND checksum IS NOT NULL
+        GROUP BY checksum
+        """
+    )
+
+    # Move payloads from the per-file layout (.chunks/<file_id>/<seq>) to their content address
+    chunks_dir = os.path.join(config.UPLOADS_DIR, '.chunks')
+    rows = op.get_bind().execute(sa.text(
+        "SELECT file_id, sequence_number, checksum FROM chunks WHERE data IS NULL AND checksum IS NOT NULL"
+    ))
+    for file_id, sequence_number, checksum in rows:
+        source = os.path.join(chunks_dir, str(file_id), f"{sequence_number:08d}")
+        target = os.path.join(chunks_dir, checksum[:2], checksum)
+        if not os.path.exists(source):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.unlink(source)
+        else:
+            os.replace(source, target)
+
+
+def downgrade() -> None:
+    op.drop_table('chunk_blobs')
@@ -0,0 +1,30 @@
+"""File content hash and ready flag
+
+Revision ID: 8d3c6f20ab14
+Revises: 5e0b3a7d19c8
+Create Date: 2026-10-18 14:47:13.652918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3c6f20ab14'
+down_revision = '5e0b3a7d19c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('files', sa.Column('is_ready', sa.Boolean(), nullable=True))
+    op.create_index(op.f('ix_files_content_hash'), 'files', ['content_hash'], unique=False)
+    # Completed files were rebuilt by the time this runs
+    op.execute("UPDATE files SET is_ready = is_complete")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_files_content_hash'), table_name='files')
+    op.drop_column('files', 'is_ready')
+    op.drop_column('files', 'content_hash')
@@ -0,0 +1,37 @@
+"""Upload sessions
+
+Revision ID: a91f0c6e58d2
+Revises: 4b7e2d91c3a5
+Create Date: 2026-10-18 10:41:07.226391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a91f0c6e58d2'
+down_revision = '4b7e2d91c3a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('chunk_size', sa.BigInteger(), nullable=False),
+    sa.Column('received', sa.LargeBinary(), nullable=False),
+    sa.Column('received_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('edited_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['file_id'], ['files.file_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('file_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('upload_sessions')
@@ -0,0 +1,24 @@
+"""Chunk blob stored size
+
+Revision ID: b6d17e4f0a93
+Revises: 3f5a8c1e9d27
+Create Date: 2026-10-18 19:02:48.331560
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d17e4f0a93'
+down_revision = '3f5a8c1e9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chunk_blobs', sa.Column('stored_size', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chunk_blobs', 'stored_size')
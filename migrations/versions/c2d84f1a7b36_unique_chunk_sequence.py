@@ -0,0 +1,46 @@
+"""Unique chunk sequence per file
+
+Revision ID: c2d84f1a7b36
+Revises: a91f0c6e58d2
+Create Date: 2026-10-18 11:58:22.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d84f1a7b36'
+down_revision = 'a91f0c6e58d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Retried uploads left duplicate rows behind, keep the latest attempt of each chunk
+    op.execute(
+        """
+        DELETE FROM chunks AS stale
+        USING chunks AS latest
+        WHERE stale.file_id = latest.file_id
+          AND stale.sequence_number = latest.sequence_number
+          AND stale.chunk_id < latest.chunk_id
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chunks_file_id_sequence_number',
+            'chunks',
+            ['file_id', 'sequence_number'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chunks_file_id_sequence_number',
+            table_name='chunks',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,24 @@
+"""Upload session received bytes
+
+Revision ID: e7a94b3c2f61
+Revises: 8d3c6f20ab14
+Create Date: 2026-10-18 16:08:42.519734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a94b3c2f61'
+down_revision = '8d3c6f20ab14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('upload_sessions', sa.Column('received_bytes', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('upload_sessions', 'received_bytes')
@@ -0,0 +1,55 @@
+"""Listing and lookup indexes
+
+Revision ID: f2b9d4a6c81e
+Revises: 4c8e2a9f71d5
+Create Date: 2026-10-18 21:34:05.917263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b9d4a6c81e'
+down_revision = '4c8e2a9f71d5'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_folders_user_id_created_at', 'folders', ['user_id', 'created_at'], None),
+    ('ix_folders_parent_id', 'folders', ['parent_id'], None),
+    ('ix_files_user_id_folder_id_created_at', 'files', ['user_id', 'folder_id', 'created_at'], None),
+    ('ix_files_user_id_file_name', 'files', ['user_id', 'file_name'], None),
+    ('ix_files_folder_id', 'files', ['folder_id'], None),
+    ('ix_files_content_hash_size_ready', 'files', ['content_hash', 'size'], 'is_ready IS true'),
+    ('ix_files_incomplete_edited_at', 'files', ['edited_at'], 'is_complete IS NOT true'),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+        # Superseded by ix_files_content_hash_size_ready
+        op.drop_index('ix_files_content_hash', table_name='files', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_files_content_hash',
+            'files',
+            ['content_hash'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,136 @@
+"""
+Checks the upload AdmissionController in memory: users waiting for a slot
+are served round robin, a request waits at most `queue_timeout`, and a
+waiter that gives up leaves nothing behind in the queues or the counters.
+
+    pipenv run python -m unittest tests.test_admission
+"""
+import asyncio
+import unittest
+
+from app.core.dependencies.admission import AdmissionController
+from app.core.exceptions import TooManyRequestsException
+
+
+def controller(**limits):
+    options = dict(
+        max_requests=1,
+        max_bytes=1024,
+        user_max_requests=4,
+        user_max_bytes=1024,
+        max_queue=8,
+        queue_timeout=5,
+        retry_after=7,
+    )
+    options.update(limits)
+    return AdmissionController(**options)
+
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    def assertIdle(self, admission):
+        self.assertEqual(admission.requests, 0)
+        self.assertEqual(admission.bytes, 0)
+        self.assertEqual(admission.queued, 0)
+        self.assertFalse(admission.queues)
+        self.assertFalse(admission.user_requests)
+        self.assertFalse(admission.user_bytes)
+
+    async def test_request_that_fits_is_granted_at_once(self):
+        admission = controller(max_requests=2)
+        async with admission.admit("a", 10):
+            self.assertEqual(admission.requests, 1)
+            self.assertEqual(admission.user_bytes["a"], 10)
+        self.assertIdle(admission)
+        self.assertEqual(admission.admitted, 1)
+
+    async def test_oversized_request_is_served_alone(self):
+        admission = controller(max_requests=2, max_bytes=100, user_max_bytes=50)
+        async with admission.admit("a", 1000):
+            self.assertEqual(admission.bytes, 50)
+            self.assertFalse(admission.fits("b", 60))
+        self.assertIdle(admission)
+
+    async def test_users_are_served_round_robin(self):
+        admission = controller()
+        await admission.acquire("holder", 1)
+        waiters = []
+        for key in ("a", "a", "b"):
+            waiters.append(asyncio.create_task(admission.acquire(key, 1)))
+            await asyncio.sleep(0)
+        self.assertEqual(admission.queued, 3)
+
+        # Each release hands the only slot over to the next user in turn,
+        # the second upload of a waits for b's first
+        granted = []
+        for key in ("holder", "a", "b", "a"):
+            admission.release(key, 1)
+            granted.extend(admission.user_requests)
+        self.assertEqual(granted, ["a", "b", "a"])
+
+        await asyncio.gather(*waiters)
+        self.assertIdle(admission)
+
+    async def test_waiter_times_out_with_retry_after(self):
+        admission = controller(queue_timeout=0.01)
+        await admission.acquire("holder", 1)
+        with self.assertRaises(TooManyRequestsException) as raised:
+            await admission.acquire("a", 1)
+        self.assertEqual(raised.exception.headers, {"Retry-After": "7"})
+        self.assertEqual(admission.rejected["timeout"], 1)
+
+        admission.release("holder", 1)
+        self.assertIdle(admission)
+
+    async def test_full_queues_reject_at_once(self):
+        admission = controller(max_queue=1, user_max_requests=1)
+        await admission.acquire("holder", 1)
+        waiter = asyncio.create_task(admission.acquire("a", 1))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(TooManyRequestsException):
+            await admission.acquire("b", 1)
+        self.assertEqual(admission.rejected["queue_full"], 1)
+
+        admission.max_queue = 2
+        with self.assertRaises(TooManyRequestsException):
+            await admission.acquire("a", 1)
+        self.assertEqual(admission.rejected["user_queue_full"], 1)
+
+        admission.release("holder", 1)
+        await waiter
+        admission.release("a", 1)
+        self.assertIdle(admission)
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        admission = controller()
+        await admission.acquire("holder", 1)
+        waiter = asyncio.create_task(admission.acquire("a", 1))
+        await asyncio.sleep(0)
+        self.assertEqual(admission.queued, 1)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(admission.queued, 0)
+        self.assertFalse(admission.queues)
+
+        admission.release("holder", 1)
+        self.assertIdle(admission)
+
+    async def test_waiter_cancelled_once_granted_releases_its_slot(self):
+        admission = controller()
+        await admission.acquire("holder", 1)
+        waiter = asyncio.create_task(admission.acquire("a", 1))
+        await asyncio.sleep(0)
+
+        # The slot is handed over before the waiter gets to run again
+        admission.release("holder", 1)
+        self.assertEqual(admission.user_requests["a"], 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertIdle(admission)
+
+
+if __name__ == "__main__":
+    unittest.main()
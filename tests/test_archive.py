@@ -0,0 +1,77 @@
+"""
+Reads back the ZIP archives `iter_zip_archive` streams, with the standard
+zipfile module.
+
+    pipenv run python -m unittest tests.test_archive
+"""
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+from unittest import mock
+
+from app.core.storage.archive import ArchiveEntry, iter_zip_archive
+
+MODIFIED = datetime(2024, 5, 17, 12, 30, 10)
+
+
+class ZipArchiveTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def file_with(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        return path
+
+    async def archive_of(self, entries):
+        blocks = [block async for block in iter_zip_archive(entries)]
+        return zipfile.ZipFile(io.BytesIO(b"".join(blocks)))
+
+    async def test_files_and_folders(self):
+        text = b"hello archive\n" * 1000
+        binary = os.urandom(3000)
+        archive = await self.archive_of([
+            ArchiveEntry(name="docs/", modified=MODIFIED),
+            ArchiveEntry(name="docs/notes.txt", path=self.file_with("notes", text), modified=MODIFIED),
+            ArchiveEntry(name="photo.jpg", path=self.file_with("photo", binary), modified=MODIFIED, compress=False),
+        ])
+
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), ["docs/", "docs/notes.txt", "photo.jpg"])
+        self.assertTrue(archive.getinfo("docs/").is_dir())
+        self.assertEqual(archive.read("docs/notes.txt"), text)
+        self.assertEqual(archive.read("photo.jpg"), binary)
+        self.assertEqual(archive.getinfo("docs/notes.txt").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo("photo.jpg").compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo("photo.jpg").date_time, (2024, 5, 17, 12, 30, 10))
+
+    async def test_content_is_streamed_in_blocks(self):
+        content = os.urandom(10000)
+        entry = ArchiveEntry(name="large.bin", path=self.file_with("large", content), modified=MODIFIED, compress=False)
+        with mock.patch("app.core.storage.archive.config.CHUNK_STORE_BLOCK_SIZE", 1024):
+            blocks = [block async for block in iter_zip_archive([entry])]
+        self.assertLessEqual(max(len(block) for block in blocks), 2048)
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(b"".join(blocks))).read("large.bin"), content)
+
+    async def test_missing_files_are_left_out(self):
+        archive = await self.archive_of([
+            ArchiveEntry(name="gone.txt", path=os.path.join(self.directory, "gone"), modified=MODIFIED),
+            ArchiveEntry(name="kept.txt", path=self.file_with("kept", b"kept"), modified=MODIFIED),
+        ])
+        self.assertEqual(archive.namelist(), ["kept.txt"])
+        self.assertEqual(archive.read("kept.txt"), b"kept")
+
+    async def test_dates_before_1980_are_clamped(self):
+        entry = ArchiveEntry(name="old.txt", path=self.file_with("old", b"old"), modified=datetime(1970, 1, 1))
+        archive = await self.archive_of([entry])
+        self.assertEqual(archive.getinfo("old.txt").date_time, (1980, 1, 1, 0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Checks the received-chunk bitmap helpers against the bit order Postgres
+set_bit uses on bytea, least significant bit of each byte first.
+
+    pipenv run python -m unittest tests.test_bitmap
+"""
+import unittest
+
+from app.core.utils import bitmap_size, is_bit_set, missing_ranges
+
+
+def bitmap_of(bits, received):
+    bitmap = bytearray(bitmap_size(bits))
+    for index in received:
+        bitmap[index >> 3] |= 1 << (index & 7)
+    return bytes(bitmap)
+
+
+class BitmapTest(unittest.TestCase):
+    def test_bitmap_size(self):
+        self.assertEqual(bitmap_size(0), 0)
+        self.assertEqual(bitmap_size(1), 1)
+        self.assertEqual(bitmap_size(8), 1)
+        self.assertEqual(bitmap_size(9), 2)
+
+    def test_bit_order_matches_postgres(self):
+        # SELECT set_bit('\x0000'::bytea, 9, 1) is \x0002
+        bitmap = b"\x00\x02"
+        self.assertTrue(is_bit_set(bitmap, 9))
+        self.assertFalse(any(is_bit_set(bitmap, index) for index in range(16) if index != 9))
+        self.assertTrue(is_bit_set(b"\x01", 0))
+        self.assertTrue(is_bit_set(b"\x80", 7))
+
+    def test_missing_ranges(self):
+        self.assertEqual(missing_ranges(bitmap_of(10, []), 10), [[0, 9]])
+        self.assertEqual(missing_ranges(bitmap_of(10, range(10)), 10), [])
+        self.assertEqual(missing_ranges(bitmap_of(10, [0, 3, 4, 9]), 10), [[1, 2], [5, 8]])
+
+    def test_missing_ranges_across_whole_bytes(self):
+        bits = 40
+        received = set(range(bits)) - set(range(6, 27)) - {39}
+        self.assertEqual(missing_ranges(bitmap_of(bits, received), bits), [[6, 26], [39, 39]])
+
+    def test_padding_bits_are_ignored(self):
+        # Bits past the last chunk may be anything
+        self.assertEqual(missing_ranges(b"\x07", 3), [])
+        self.assertEqual(missing_ranges(b"\xfb", 3), [[2, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Checks how client chunk checksums are parsed, and that DiskChunkStore
+verifies them while staging a payload, in a temporary directory.
+
+    pipenv run python -m unittest tests.test_checksums
+"""
+import hashlib
+import tempfile
+import unittest
+
+from app.core.exceptions import BadRequestException, ChecksumMismatchException
+from app.core.storage import DiskChunkStore, iter_bytes, make_digest, parse_chunk_checksum
+
+PAYLOAD = b"123456789"
+# Check value of the CRC-32C (Castagnoli) catalogue entry
+PAYLOAD_CRC32C = "e3069283"
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class ParseChunkChecksumTest(unittest.TestCase):
+    def test_accepted_forms(self):
+        self.assertIsNone(parse_chunk_checksum(None))
+        self.assertIsNone(parse_chunk_checksum(""))
+
+        checksum = parse_chunk_checksum(PAYLOAD_SHA256)
+        self.assertEqual((checksum.algorithm, checksum.value), ("sha256", PAYLOAD_SHA256))
+        checksum = parse_chunk_checksum(f"SHA256={PAYLOAD_SHA256.upper()}")
+        self.assertEqual((checksum.algorithm, checksum.value), ("sha256", PAYLOAD_SHA256))
+        checksum = parse_chunk_checksum(f" crc32c = {PAYLOAD_CRC32C.upper()} ")
+        self.assertEqual((checksum.algorithm, checksum.value), ("crc32c", PAYLOAD_CRC32C))
+
+    def test_refused_forms(self):
+        for value in (
+            f"md5={hashlib.md5(PAYLOAD).hexdigest()}",
+            "crc32c=e306928",
+            "crc32c=e306928g",
+            PAYLOAD_SHA256[:-1],
+            f"sha256={PAYLOAD_CRC32C}",
+        ):
+            with self.subTest(value=value), self.assertRaises(BadRequestException):
+                parse_chunk_checksum(value)
+
+    def test_digests(self):
+        crc = make_digest("crc32c")
+        crc.update(PAYLOAD[:4])
+        crc.update(PAYLOAD[4:])
+        self.assertEqual(crc.hexdigest(), PAYLOAD_CRC32C)
+        self.assertEqual(make_digest("crc32c").hexdigest(), "00000000")
+
+        sha256 = make_digest("sha256")
+        sha256.update(PAYLOAD)
+        self.assertEqual(sha256.hexdigest(), PAYLOAD_SHA256)
+
+
+class DiskChunkStoreChecksumTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = DiskChunkStore(directory.name)
+
+    def staged_files(self):
+        return list(self.store.staging.glob("*")) if self.store.staging.exists() else []
+
+    async def write(self, checksum):
+        return await self.store.write(iter_bytes(PAYLOAD), expected_checksum=parse_chunk_checksum(checksum))
+
+    async def test_matching_checksums(self):
+        for checksum in (None, PAYLOAD_SHA256, f"crc32c={PAYLOAD_CRC32C}"):
+            with self.subTest(checksum=checksum):
+                stored = await self.write(checksum)
+                self.assertEqual(stored.length, len(PAYLOAD))
+                self.assertEqual(stored.checksum, PAYLOAD_SHA256)
+                await self.store.discard(stored)
+
+        stored = await self.write(f"crc32c={PAYLOAD_CRC32C}")
+        self.assertEqual(stored.crc32c, PAYLOAD_CRC32C)
+        await self.store.discard(stored)
+        self.assertEqual(self.staged_files(), [])
+
+    async def test_mismatch_drops_the_staged_payload(self):
+        for checksum in (hashlib.sha256(b"other").hexdigest(), "crc32c=00000000"):
+            with self.subTest(checksum=checksum):
+                with self.assertRaises(ChecksumMismatchException):
+                    await self.write(checksum)
+                self.assertEqual(self.staged_files(), [])
+
+    async def test_content_already_held_is_verified_too(self):
+        stored = await self.write(PAYLOAD_SHA256)
+        await self.store.persist(stored)
+
+        stored = await self.write(PAYLOAD_SHA256)
+        self.assertIsNone(stored.staged)
+        with self.assertRaises(ChecksumMismatchException):
+            await self.store.write(iter_bytes(b"other"), expected_checksum=parse_chunk_checksum(PAYLOAD_SHA256))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Checks zstd chunk compression: a compressed chunk reads back the same,
+from the start or from an offset, and content that does not compress is
+kept raw.
+
+    pipenv run python -m unittest tests.test_compression
+"""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.core.storage import DiskChunkStore, is_compressed_type, iter_bytes
+from app.core.storage.compression import compress_file, open_decompressed
+
+TEXT = b"".join(b"line %d of a rather repetitive log file\n" % index for index in range(20000))
+
+
+class CompressFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def file_with(self, content):
+        path = self.directory / "source"
+        path.write_bytes(content)
+        return path
+
+    def test_round_trip(self):
+        target = self.directory / "source.zst"
+        stored_size = compress_file(self.file_with(TEXT), target)
+        self.assertEqual(stored_size, target.stat().st_size)
+        self.assertLess(stored_size, len(TEXT) // 4)
+
+        with open_decompressed(target) as handle:
+            self.assertEqual(handle.read(), TEXT)
+        with open_decompressed(target) as handle:
+            handle.seek(len(TEXT) // 2)
+            self.assertEqual(handle.read(100), TEXT[len(TEXT) // 2:len(TEXT) // 2 + 100])
+            self.assertEqual(handle.read(), TEXT[len(TEXT) // 2 + 100:])
+
+    def test_incompressible_content_is_skipped(self):
+        target = self.directory / "source.zst"
+        self.assertIsNone(compress_file(self.file_with(os.urandom(256 * 1024)), target))
+        self.assertFalse(target.exists())
+        self.assertIsNone(compress_file(self.file_with(b""), target))
+
+    def test_compressed_types(self):
+        for file_type in ("image/jpeg", "video/mp4", "application/zip", "pdf", ".mp3", "photo.HEIC"):
+            with self.subTest(file_type=file_type):
+                self.assertTrue(is_compressed_type(file_type))
+        for file_type in (None, "", "text/plain", "image/svg+xml", "csv", "application/json"):
+            with self.subTest(file_type=file_type):
+                self.assertFalse(is_compressed_type(file_type))
+
+
+class DiskChunkStoreCompressionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = DiskChunkStore(directory.name)
+
+    async def persist(self, content, compressible=True):
+        stored = await self.store.write(iter_bytes(content), compressible=compressible)
+        return stored, await self.store.persist(stored)
+
+    async def test_compressible_chunk_is_stored_compressed(self):
+        stored, stored_size = await self.persist(TEXT)
+        self.assertTrue(self.store.is_compressed(stored.checksum))
+        self.assertFalse(self.store.path(stored.checksum).exists())
+        self.assertLess(stored_size, len(TEXT))
+        with self.store.open(stored.checksum) as handle:
+            handle.seek(1000)
+            self.assertEqual(handle.read(), TEXT[1000:])
+        self.assertEqual(self.store.stats["compressed_chunks"], 1)
+
+    async def test_incompressible_chunk_is_stored_raw(self):
+        content = os.urandom(256 * 1024)
+        stored, stored_size = await self.persist(content)
+        self.assertEqual(stored_size, len(content))
+        self.assertFalse(self.store.is_compressed(stored.checksum))
+        with self.store.open(stored.checksum) as handle:
+            self.assertEqual(handle.read(), content)
+
+        stored, stored_size = await self.persist(TEXT, compressible=False)
+        self.assertEqual(stored_size, len(TEXT))
+        self.assertFalse(self.store.is_compressed(stored.checksum))
+        self.assertEqual(self.store.stats["raw_chunks"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
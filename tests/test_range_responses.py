@@ -0,0 +1,195 @@
+"""
+Checks `Range` header parsing and the bodies ByteRangeResponse sends for
+whole, single range and multipart/byteranges answers, read off a
+temporary file, and ChunkRangeResponse serving the same from chunks.
+
+    pipenv run python -m unittest tests.test_range_responses
+"""
+import email
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+
+from starlette.requests import Request
+
+from app.core.exceptions import NotFoundException
+from app.core.storage.responses import MAX_RANGES, ByteRangeResponse, ChunkRangeResponse, parse_range_header
+
+CONTENT = bytes(range(256)) * 4
+ETAG = '"content"'
+CHUNK_SIZE = 100
+
+Span = namedtuple("Span", "offset length checksum data")
+
+
+def request_with(headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+async def body_of(test, response):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await response({"type": "http", "method": "GET"}, None, send)
+    test.assertEqual(messages[0]["type"], "http.response.start")
+    test.assertFalse(messages[-1]["more_body"])
+    return b"".join(message["body"] for message in messages[1:])
+
+
+class ParseRangeHeaderTest(unittest.TestCase):
+    def test_single_ranges(self):
+        self.assertEqual(parse_range_header("bytes=0-99", 1000), [(0, 100)])
+        self.assertEqual(parse_range_header("bytes=900-", 1000), [(900, 1000)])
+        self.assertEqual(parse_range_header("bytes=-100", 1000), [(900, 1000)])
+        self.assertEqual(parse_range_header("bytes=-5000", 1000), [(0, 1000)])
+        self.assertEqual(parse_range_header("bytes=990-5000", 1000), [(990, 1000)])
+
+    def test_ranges_are_sorted_and_merged(self):
+        self.assertEqual(
+            parse_range_header("bytes=500-599, 0-9, 5-19, 20-29, 700-", 1000),
+            [(0, 30), (500, 600), (700, 1000)],
+        )
+
+    def test_unsatisfiable_ranges(self):
+        self.assertEqual(parse_range_header("bytes=1000-", 1000), [])
+        self.assertEqual(parse_range_header("bytes=-0", 1000), [])
+
+    def test_ignored_headers(self):
+        for value in ("items=0-1", "bytes=", "bytes=5", "bytes=a-b", "bytes=9-3"):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_range_header(value, 1000))
+        too_many = ",".join(f"{index * 2}-{index * 2}" for index in range(MAX_RANGES + 1))
+        self.assertIsNone(parse_range_header(f"bytes={too_many}", 1000))
+
+
+class ByteRangeResponseTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, CONTENT)
+        os.close(handle)
+        self.addCleanup(os.unlink, self.path)
+
+    def respond(self, headers, **options):
+        return ByteRangeResponse(
+            self.path,
+            request_with(headers),
+            size=len(CONTENT),
+            media_type="application/octet-stream",
+            etag=ETAG,
+            **options,
+        )
+
+    async def test_whole_file(self):
+        response = self.respond({})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-length"], str(len(CONTENT)))
+        self.assertEqual(await body_of(self, response), CONTENT)
+
+    async def test_single_range(self):
+        response = self.respond({"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["content-range"], f"bytes 10-19/{len(CONTENT)}")
+        self.assertEqual(await body_of(self, response), CONTENT[10:20])
+
+    async def test_multipart_byteranges(self):
+        response = self.respond({"Range": "bytes=0-3,100-109,-6"})
+        self.assertEqual(response.status_code, 206)
+        body = await body_of(self, response)
+        self.assertEqual(response.headers["content-length"], str(len(body)))
+
+        content_type = response.headers["content-type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = [
+            (part["Content-Range"], part.get_payload(decode=True))
+            for part in message.get_payload()
+        ]
+        size = len(CONTENT)
+        self.assertEqual(parts, [
+            (f"bytes 0-3/{size}", CONTENT[0:4]),
+            (f"bytes 100-109/{size}", CONTENT[100:110]),
+            (f"bytes {size - 6}-{size - 1}/{size}", CONTENT[-6:]),
+        ])
+
+    async def test_unsatisfiable_range(self):
+        response = self.respond({"Range": f"bytes={len(CONTENT)}-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["content-range"], f"bytes */{len(CONTENT)}")
+        self.assertEqual(await body_of(self, response), b"")
+
+    async def test_conditional_requests(self):
+        self.assertEqual(self.respond({"If-None-Match": f"W/{ETAG}"}).status_code, 304)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.respond({"Range": "bytes=0-0", "If-Range": '"old"'}).status_code, 200)
+        self.assertEqual(self.respond({"Range": "bytes=0-0", "If-Range": ETAG}).status_code, 206)
+
+    async def test_bounds_clip_ranges(self):
+        response = self.respond({}, bounds=(100, 200))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await body_of(self, response), CONTENT[100:200])
+
+        response = self.respond({"Range": "bytes=150-"}, bounds=(100, 200))
+        self.assertEqual(await body_of(self, response), CONTENT[150:200])
+        self.assertEqual(self.respond({"Range": "bytes=0-9"}, bounds=(100, 200)).status_code, 416)
+
+
+class ChunkRangeResponseTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.chunks = [
+            Span(offset, len(CONTENT[offset:offset + CHUNK_SIZE]), None, CONTENT[offset:offset + CHUNK_SIZE])
+            for offset in range(0, len(CONTENT), CHUNK_SIZE)
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "assembled")
+
+    async def spans(self, start, stop):
+        for span in self.chunks:
+            if span.offset < stop and span.offset + span.length > start:
+                yield span
+
+    def respond(self, headers):
+        return ChunkRangeResponse(
+            self.spans,
+            None,
+            self.path,
+            request_with(headers),
+            size=len(CONTENT),
+            media_type="application/octet-stream",
+            etag=ETAG,
+        )
+
+    async def test_ranges_span_chunks(self):
+        self.assertEqual(await body_of(self, self.respond({})), CONTENT)
+        self.assertEqual(await body_of(self, self.respond({"Range": "bytes=95-304"})), CONTENT[95:305])
+
+    async def test_released_chunks_are_read_from_the_rebuilt_file(self):
+        with open(self.path, "wb") as handle:
+            handle.write(CONTENT)
+        self.chunks = self.chunks[:2]
+        self.assertEqual(await body_of(self, self.respond({"Range": "bytes=150-449"})), CONTENT[150:450])
+        self.chunks = []
+        self.assertEqual(await body_of(self, self.respond({})), CONTENT)
+
+    async def test_missing_content_fails_before_the_response_starts(self):
+        self.chunks = []
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        with self.assertRaises(NotFoundException):
+            await self.respond({})({"type": "http", "method": "GET"}, None, send)
+        self.assertEqual(messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Checks which session `get_async_session()` hands out inside and outside a
+request, and that nested blocks share the request's session without
+closing or committing it. No statement is executed, so no database is
+needed.
+
+    pipenv run python -m unittest tests.test_session
+"""
+import importlib
+import unittest
+import uuid
+from unittest import mock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_async_session
+from app.models import User
+
+# app.core.db exports the scoped session under the module's name
+db_session = importlib.import_module("app.core.db.session")
+
+
+class SessionHandleTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        close = mock.patch.object(AsyncSession, "close", autospec=True)
+        commit = mock.patch.object(AsyncSession, "commit", autospec=True)
+        self.close = close.start()
+        self.commit = commit.start()
+        self.addCleanup(close.stop)
+        self.addCleanup(commit.stop)
+
+    def enter_request(self):
+        context = db_session.set_session_context(str(uuid.uuid4()))
+        self.addCleanup(db_session.reset_session_context, context)
+        self.addCleanup(db_session.session.registry.clear)
+
+    async def test_nested_block_shares_the_request_session(self):
+        self.enter_request()
+        async with get_async_session() as outer:
+            user = User(id=uuid.uuid4(), email="user@example.com")
+            outer.add(user)
+
+            async with get_async_session() as inner:
+                self.assertIs(inner, outer)
+            # The request's pending changes are still there, neither committed nor dropped
+            self.close.assert_not_called()
+            self.commit.assert_not_called()
+            self.assertIn(user, outer.new)
+
+            self.assertIs(get_async_session().target(), outer)
+        self.close.assert_called_once_with(outer)
+        self.commit.assert_not_called()
+
+    async def test_blocks_outside_a_request_use_sessions_of_their_own(self):
+        async with get_async_session() as first:
+            async with get_async_session() as second:
+                self.assertIsNot(first, second)
+            self.close.assert_called_once_with(second)
+        self.assertEqual(self.close.call_count, 2)
+
+    async def test_handle_used_as_a_dependency_forwards_to_the_session(self):
+        self.enter_request()
+        handle = get_async_session()
+        self.assertIs(handle.sync_session, db_session.session().sync_session)
+
+
+if __name__ == "__main__":
+    unittest.main()
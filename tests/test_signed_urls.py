@@ -0,0 +1,119 @@
+"""
+Checks the HMAC signed tokens of download links and instant upload
+possession challenges: they round trip, and anything tampered with,
+expired or presented by someone else is refused.
+
+    pipenv run python -m unittest tests.test_signed_urls
+"""
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from unittest import mock
+
+from app.core.exceptions import ForbiddenException, GoneException
+from app.core.utils import DownloadGrant, PossessionService, SignedUrlService, possession_proof
+from app.core.utils.signed_url import decode_segment, encode_segment
+
+USER_ID = uuid.UUID(int=1)
+CONTENT = os.urandom(5000)
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+
+
+def grant_of(**fields):
+    values = dict(
+        file_id=1,
+        file_name="report.pdf",
+        media_type="application/pdf",
+        size=1024,
+        expires=int(time.time()) + 60,
+    )
+    values.update(fields)
+    return DownloadGrant(**values)
+
+
+class SignedUrlServiceTest(unittest.TestCase):
+    def test_round_trip(self):
+        grant = grant_of(byte_range=(0, 512), ip="10.0.0.1")
+        self.assertEqual(SignedUrlService.verify(SignedUrlService.sign(grant), "10.0.0.1"), grant)
+
+    def test_tampered_link_is_refused(self):
+        token = SignedUrlService.sign(grant_of())
+        payload, _, signed = token.partition(".")
+        forged = encode_segment(decode_segment(payload).replace(b'"report.pdf"', b'"other.pdf"'))
+        for bad in (f"{forged}.{signed}", f"{payload}.{signed[:-2]}", payload):
+            with self.subTest(token=bad), self.assertRaises(ForbiddenException):
+                SignedUrlService.verify(bad, None)
+
+    def test_link_signed_with_another_secret_is_refused(self):
+        token = SignedUrlService.sign(grant_of())
+        with mock.patch("app.core.utils.signed_url.config.DOWNLOAD_URL_SECRET", "rotated"):
+            with self.assertRaises(ForbiddenException):
+                SignedUrlService.verify(token, None)
+
+    def test_expired_link_is_gone(self):
+        token = SignedUrlService.sign(grant_of(expires=int(time.time()) - 1))
+        with self.assertRaises(GoneException):
+            SignedUrlService.verify(token, None)
+
+    def test_link_bound_to_an_address(self):
+        token = SignedUrlService.sign(grant_of(ip="10.0.0.1"))
+        with self.assertRaises(ForbiddenException):
+            SignedUrlService.verify(token, "10.0.0.2")
+        self.assertIsNone(SignedUrlService.verify(SignedUrlService.sign(grant_of()), "10.0.0.2").ip)
+
+
+class PossessionServiceTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, CONTENT)
+        os.close(handle)
+        self.addCleanup(os.unlink, self.path)
+
+    def test_challenge_round_trip(self):
+        challenge = PossessionService.issue(USER_ID, CONTENT_HASH, len(CONTENT))
+        self.assertTrue(challenge.ranges)
+        for offset, length in challenge.ranges:
+            self.assertLessEqual(offset + length, len(CONTENT))
+        self.assertEqual(challenge.ranges, sorted(challenge.ranges))
+        self.assertEqual(PossessionService.verify(challenge.token, USER_ID, CONTENT_HASH, len(CONTENT)), challenge)
+
+    def test_proof_covers_the_challenged_bytes(self):
+        nonce = "00ff"
+        ranges = [(0, 10), (4000, 1000)]
+        expected = hashlib.sha256(b"\x00\xff" + CONTENT[0:10] + CONTENT[4000:5000]).hexdigest()
+        self.assertEqual(possession_proof(self.path, nonce, ranges), expected)
+        self.assertNotEqual(possession_proof(self.path, "01ff", ranges), expected)
+
+    def test_small_file_is_covered_whole(self):
+        challenge = PossessionService.issue(USER_ID, CONTENT_HASH, 10)
+        self.assertTrue(all(range_ == (0, 10) for range_ in challenge.ranges))
+        self.assertEqual(PossessionService.issue(USER_ID, CONTENT_HASH, 0).ranges, [])
+
+    def test_challenge_for_another_upload_is_refused(self):
+        token = PossessionService.issue(USER_ID, CONTENT_HASH, len(CONTENT)).token
+        for user_id, content_hash, size in (
+            (uuid.UUID(int=2), CONTENT_HASH, len(CONTENT)),
+            (USER_ID, "0" * 64, len(CONTENT)),
+            (USER_ID, CONTENT_HASH, len(CONTENT) + 1),
+        ):
+            with self.subTest(user_id=user_id, content_hash=content_hash, size=size):
+                with self.assertRaises(ForbiddenException):
+                    PossessionService.verify(token, user_id, content_hash, size)
+
+    def test_download_link_does_not_pass_for_a_challenge(self):
+        token = SignedUrlService.sign(grant_of())
+        with self.assertRaises(ForbiddenException):
+            PossessionService.verify(token, USER_ID, CONTENT_HASH, len(CONTENT))
+
+    def test_expired_challenge_is_gone(self):
+        with mock.patch("app.core.utils.possession.config.INSTANT_UPLOAD_PROOF_TTL", -1):
+            token = PossessionService.issue(USER_ID, CONTENT_HASH, len(CONTENT)).token
+        with self.assertRaises(GoneException):
+            PossessionService.verify(token, USER_ID, CONTENT_HASH, len(CONTENT))
+
+
+if __name__ == "__main__":
+    unittest.main()